@@ -1,26 +1,34 @@
 import os
+import json
+import time
 import asyncio
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 import sys
 from google.adk.agents.llm_agent import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.tools.mcp_tool import McpToolset
 from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
 from mcp import StdioServerParameters
 from google.genai import types
-from llama_index.core import VectorStoreIndex, Settings as LlamaSettings
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-import chromadb
-import speech_recognition as sr
-import tempfile
+from cache import TTLCache, SemanticCache, SingleFlight, depends_on_context, normalize_query
+from sessions import BoundedSessionService, SqliteSessionService
+from voice import VOICE_BACKEND, VOICE_WORKERS, Transcriber, TranscriptionError, server_timing
+from rate_limit import AdmissionController, MemoryBucketStore, RateLimited, RateLimiter, SqliteBucketStore
+import mcp_server
+from catalog import read_catalog_version, read_catalog_manifest, active_collection_name
+from lexical_index import BM25Index, LexicalStats, fuse_scores, is_decisive, lexical_file
+from intent_router import IntentRouterStats, render, route, turn_events
+from metrics import REGISTRY, AgentCallbackTimer, Gauge, MetricsMiddleware, record_stage, record_tool_call, stage
+# llama_index, chromadb, the embedding backend and speech_recognition are imported on first use to keep cold starts fast
 
 
 
@@ -31,8 +39,79 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Model behind the agent; "stub" uses the deterministic offline model in stub_llm.py (benchmarks)
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gemini-2.5-flash-lite")
+
+# Agent execution: max conversations running through the ADK runner at once, and how
+# many more may wait (and for how long) before new requests are turned away with 429
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", "32"))
+AGENT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Per-customer token buckets (0 disables); "sqlite" shares buckets between workers
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.db")
+
+# Transaction tools: "stdio" runs mcp_server.py as a child process over MCP,
+# "inprocess" registers the same functions directly as ADK function tools
+MCP_TOOL_MODE = os.getenv("MCP_TOOL_MODE", "stdio").lower()
+
+# Product knowledge caches (query embeddings and retrieval results)
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "1024"))
+RAG_CACHE_TTL_SECONDS = float(os.getenv("RAG_CACHE_TTL_SECONDS", "900"))
+# How often product queries check whether setup_rag.py has rebuilt the catalog
+RAG_VERSION_CHECK_SECONDS = float(os.getenv("RAG_VERSION_CHECK_SECONDS", "5"))
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+
+# Query embedding backend: "torch", "onnx" or "onnx-int8" (see embeddings.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+
+# Product retrieval: "chroma" queries the Chroma collection, "numpy" searches the
+# memory-mapped vectors setup_rag.py writes next to it (see vector_index.py)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma").lower()
+
+# Lexical (BM25) fast path run before vector retrieval: answer directly when the
+# top chunk covers the query's terms and beats the runner-up by LEXICAL_MARGIN,
+# otherwise blend lexical scores into the vector ranking with LEXICAL_FUSION_WEIGHT
+LEXICAL_ENABLED = os.getenv("LEXICAL_ENABLED", "true").lower() == "true"
+LEXICAL_MIN_COVERAGE = float(os.getenv("LEXICAL_MIN_COVERAGE", "1.0"))
+LEXICAL_MARGIN = float(os.getenv("LEXICAL_MARGIN", "1.5"))
+LEXICAL_FUSION_WEIGHT = float(os.getenv("LEXICAL_FUSION_WEIGHT", "0.3"))
+
+# Semantic answer cache for product-only questions (opt-in)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+
+# Deterministic fast path: simple balance / transaction questions call the tool
+# directly and get a templated answer instead of a model turn (see intent_router.py)
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+
+# Identical queries from the same customer and session that arrive while one is
+# still running (client retries, double submits) share that run's answer
+QUERY_COALESCING_ENABLED = os.getenv("QUERY_COALESCING_ENABLED", "true").lower() == "true"
+
+# Conversation memory: sessions kept, idle eviction, and user turns of history sent to the model
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800"))
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "10"))
+
+# Session store: "memory" (one process) or "sqlite" (shared by all workers on the host)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+
+# Attempts (with backoff) for critical startup components before the worker reports them failed
+STARTUP_RETRY_ATTEMPTS = int(os.getenv("STARTUP_RETRY_ATTEMPTS", "5"))
+
+# uvicorn worker processes when started with `python api_server.py`
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
 
 app = FastAPI(title="Banking Agent API", version="1.0.0")
+app.add_middleware(MetricsMiddleware)
 
 
 security = HTTPBearer()
@@ -72,28 +151,152 @@ MOCK_USERS = {
 agent = None
 runner = None
 session_service = None
+transaction_tools = []
+admission = AdmissionController(AGENT_MAX_CONCURRENCY, AGENT_MAX_QUEUE, AGENT_QUEUE_TIMEOUT_SECONDS)
+rate_limiter = RateLimiter(
+    SqliteBucketStore(RATE_LIMIT_DB_PATH) if RATE_LIMIT_BACKEND == "sqlite" else MemoryBucketStore(),
+    RATE_LIMIT_PER_MINUTE,
+    RATE_LIMIT_BURST
+)
+
+transcriber = Transcriber(VOICE_BACKEND, VOICE_WORKERS)
+
+embed_model = None
+rag_retriever = None
+lexical_index = None
+lexical_stats = LexicalStats()
+rag_catalog_version = None
+rag_version_checked_at = 0.0
+rag_reload_lock = threading.Lock()
+embedding_cache = TTLCache(RAG_CACHE_SIZE, RAG_CACHE_TTL_SECONDS)
+retrieval_cache = TTLCache(RAG_CACHE_SIZE, RAG_CACHE_TTL_SECONDS)
+answer_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL_SECONDS)
+query_flights = SingleFlight()
+intent_stats = IntentRouterStats()
+agent_timer = AgentCallbackTimer()
+
+REGISTRY.register(Gauge("bank_agent_sessions", "Conversation sessions held by the session service.")).set_function(
+    lambda: session_service.stats()["live_sessions"] if session_service is not None else 0)
+REGISTRY.register(Gauge("bank_agent_agent_runs_in_flight", "Agent runs holding an admission slot.")).set_function(
+    lambda: admission.in_flight)
+REGISTRY.register(Gauge("bank_agent_agent_runs_queued", "Agent runs waiting for an admission slot.")).set_function(
+    lambda: admission.queued)
+
+# Answers are only cached when every tool the agent used is in this set
+PRODUCT_ONLY_TOOLS = {"search_product_knowledge"}
 
 def setup_rag_retriever():
     """Set up RAG retriever."""
+    global embed_model, rag_retriever, rag_catalog_version, lexical_index
+    from llama_index.core import Settings as LlamaSettings
+    
     print("Loading RAG system...")
-    embed_model = HuggingFaceEmbedding(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    LlamaSettings.embed_model = embed_model
+    if embed_model is None:
+        from embeddings import create_embed_model
+        model = create_embed_model(EMBED_BACKEND)
+        model.get_query_embedding("warm up")  # first call pays for lazy model setup
+        LlamaSettings.embed_model = model
+        embed_model = model
+    
+    catalog_version = read_catalog_version(CHROMA_PATH)
+    collection_name = active_collection_name(CHROMA_PATH)
+    index_backend = read_catalog_manifest(CHROMA_PATH).get("embed_backend", "torch")
+    if index_backend != EMBED_BACKEND:
+        print(f"Note: product index was embedded with the {index_backend} backend, "
+              f"queries use {EMBED_BACKEND} (run bench_embeddings.py to check ranking agreement)")
+    
+    if RAG_BACKEND == "numpy":
+        from vector_index import NumpyVectorIndex
+        retriever = NumpyVectorIndex.load(CHROMA_PATH, collection_name, similarity_top_k=3)
+        retriever.search(embed_model.get_query_embedding("credit card"))  # page in the vectors
+    else:
+        from llama_index.core import VectorStoreIndex
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+        import chromadb
+        
+        chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        chroma_collection = chroma_client.get_collection(collection_name)
+        
+        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        index = VectorStoreIndex.from_vector_store(vector_store)
+        retriever = index.as_retriever(similarity_top_k=3)
+        retriever.retrieve("credit card")  # load the collection's vector index
+    rag_retriever = retriever
     
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    chroma_collection = chroma_client.get_collection("bank_products")
+    lexical_path = lexical_file(CHROMA_PATH, collection_name)
+    lexical_index = BM25Index.load(lexical_path) if LEXICAL_ENABLED and os.path.exists(lexical_path) else None
     
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    index = VectorStoreIndex.from_vector_store(vector_store)
-    retriever = index.as_retriever(similarity_top_k=3)
+    # Cached results belong to the previous collection
+    embedding_cache.clear()
+    retrieval_cache.clear()
+    # Published last: a request that sees the new version also sees the new retriever
+    rag_catalog_version = catalog_version
     
     print(" RAG system loaded!")
-    return retriever
-
-def query_product_knowledge(query: str, retriever) -> str:
+    return rag_retriever
+
+def reload_rag_if_rebuilt():
+    """Reopen the collection if setup_rag.py has rebuilt it (checked every RAG_VERSION_CHECK_SECONDS)."""
+    global rag_version_checked_at
+    now = time.monotonic()
+    if rag_catalog_version is None or now - rag_version_checked_at < RAG_VERSION_CHECK_SECONDS:
+        return  # first load still finishing, or checked recently
+    rag_version_checked_at = now
+    if read_catalog_version(CHROMA_PATH) != rag_catalog_version:
+        with rag_reload_lock:
+            if read_catalog_version(CHROMA_PATH) != rag_catalog_version:
+                print("Product catalog was rebuilt, reloading RAG system...")
+                setup_rag_retriever()
+
+def embed_query(query: str) -> list:
+    """Embed a query, reusing cached embeddings for repeated phrasings."""
+    key = normalize_query(query)
+    embedding = embedding_cache.get(key)
+    if embedding is None:
+        with stage("embed"):
+            embedding = embed_model.get_query_embedding(key)
+        embedding_cache.set(key, embedding)
+    return embedding
+
+def retrieve_product_nodes(query: str, retriever, catalog_version: str) -> list:
+    """
+    Retrieve product chunks, reusing cached results for repeated phrasings.
+
+    Results are cached under the catalog version the retriever was read with,
+    so a request still running on the old retriever after a reload cannot
+    store its nodes where the new catalog's requests look them up.
+    """
+    key = (catalog_version, normalize_query(query))
+    nodes = retrieval_cache.get(key)
+    if nodes is None:
+        from llama_index.core import QueryBundle
+        query_bundle = QueryBundle(query_str=query, embedding=embed_query(query))
+        with stage("retrieve"):
+            nodes = retriever.retrieve(query_bundle)
+        retrieval_cache.set(key, nodes)
+    return nodes
+
+def query_product_knowledge(query: str, retriever=None) -> str:
     """Query product knowledge base."""
-    nodes = retriever.retrieve(query)
+    if rag_retriever is None:
+        return "Product information is still loading. Please try again in a moment."
+    
+    reload_rag_if_rebuilt()
+    catalog_version = rag_catalog_version  # read before the retriever it belongs to
+    index = lexical_index
+    with stage("lexical"):
+        matches = index.search(query) if index is not None else []
+    if is_decisive(matches, LEXICAL_MIN_COVERAGE, LEXICAL_MARGIN):
+        # Exact product or term match: no embedding needed
+        lexical_stats.record("lexical")
+        return f"Product Information:\n{matches[0].text}"
+    
+    nodes = retrieve_product_nodes(query, retriever or rag_retriever, catalog_version)
+    if matches:
+        lexical_stats.record("fused")
+        nodes = fuse_scores(nodes, matches, LEXICAL_FUSION_WEIGHT)
+    else:
+        lexical_stats.record("vector")
     
     if not nodes:
         return "I don't have information about that product. Please contact our customer service for details on products not listed in our standard catalog."
@@ -112,47 +315,14 @@ def query_product_knowledge(query: str, retriever) -> str:
     return f"Product Information:\n{context}"
 
 
-def transcribe_audio(audio_file: UploadFile) -> str:
-    """Convert audio file to text using speech recognition."""
-    try:
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            content = audio_file.file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-        
-        
-        recognizer = sr.Recognizer()
-        
-        with sr.AudioFile(tmp_file_path) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-        
-        
-        os.unlink(tmp_file_path)
-        
-        return text
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Audio transcription failed: {str(e)}"
-        )
-    
-
-async def setup_agent():
-    """Initialize agent, MCP, and RAG."""
-    global agent, runner, session_service
-    
-    print("Setting up agent...")
-    
-    
-    rag_retriever = setup_rag_retriever()
-    
-    def search_product_knowledge(query: str) -> str:
-        """Search bank product knowledge base."""
-        return query_product_knowledge(query, rag_retriever)
+def build_transaction_tools() -> list:
+    """Return the transaction tools for the configured MCP_TOOL_MODE."""
+    if MCP_TOOL_MODE == "inprocess":
+        print("Using in-process transaction tools")
+        return [mcp_server.run_in_tool_pool(tool) for tool in mcp_server.BANKING_TOOLS]
     
+    if MCP_TOOL_MODE != "stdio":
+        raise ValueError(f"Unknown MCP_TOOL_MODE: {MCP_TOOL_MODE}")
     
     mcp_toolset = McpToolset(
         connection_params=StdioConnectionParams(
@@ -163,10 +333,29 @@ async def setup_agent():
             )
         )
     )
+    return [mcp_toolset]
+
+async def setup_agent():
+    """Initialize the agent and runner (the RAG system loads separately)."""
+    global agent, runner, session_service, transaction_tools
+    
+    print("Setting up agent...")
+    
+    def search_product_knowledge(query: str) -> str:
+        """Search bank product knowledge base."""
+        return query_product_knowledge(query)
+    
+    
+    transaction_tools = build_transaction_tools()
+    
+    model = AGENT_MODEL
+    if AGENT_MODEL == "stub":
+        from stub_llm import StubLlm
+        model = StubLlm()
     
     
     agent = LlmAgent(
-    model="gemini-2.5-flash-lite",
+    model=model,
     name="banking_assistant",
     instruction=(
         "You are a banking assistant.\n"
@@ -180,14 +369,29 @@ async def setup_agent():
         "3. NEVER call MCP tools with a different customer_id than the one in brackets.\n"
         "\n"
         "For transactions and balances: Use MCP tools with the authenticated customer_id.\n"
+        "For overviews or questions covering several accounts (e.g. 'How am I doing?', "
+        "'What are my balances?'), call get_account_summary ONCE instead of separate "
+        "balance and last-transaction calls per account.\n"
+        "For questions about a period (e.g. 'my spending in December'), call "
+        "get_transactions_in_range and follow next_cursor until it is null; never "
+        "query one day at a time.\n"
         "For product questions: Use search_product_knowledge.\n"
         "Answer clearly and concisely."
     ),
-    tools=[mcp_toolset, search_product_knowledge],
+    tools=[*transaction_tools, search_product_knowledge],
+    before_model_callback=agent_timer.before_model,
+    after_model_callback=agent_timer.after_model,
+    before_tool_callback=agent_timer.before_tool,
+    after_tool_callback=agent_timer.after_tool,
 )
     
     
-    session_service = InMemorySessionService()
+    if SESSION_BACKEND == "sqlite":
+        session_service = await asyncio.to_thread(
+            SqliteSessionService, SESSION_DB_PATH, SESSION_MAX_COUNT, SESSION_IDLE_TTL_SECONDS, SESSION_HISTORY_TURNS
+        )
+    else:
+        session_service = BoundedSessionService(SESSION_MAX_COUNT, SESSION_IDLE_TTL_SECONDS, SESSION_HISTORY_TURNS)
     
     
     runner = Runner(
@@ -198,10 +402,60 @@ async def setup_agent():
     
     print(" Agent ready!")
 
+async def warm_transaction_tools():
+    """Start the MCP server (or open the in-process DB pool) before the first request."""
+    if MCP_TOOL_MODE == "inprocess":
+        await asyncio.to_thread(mcp_server.get_account_summary, "warmup")
+        return
+    for toolset in transaction_tools:
+        await toolset.get_tools()
+
+# Startup components; critical ones must be ready before the API is healthy
+startup_status = {
+    "agent": {"critical": True, "ready": False, "init_seconds": None, "error": None},
+    "transaction_tools": {"critical": True, "ready": False, "init_seconds": None, "error": None},
+    "rag": {"critical": False, "ready": False, "init_seconds": None, "error": None},
+}
+startup_tasks = set()
+
+async def init_component(name: str, init):
+    """
+    Run one startup step and record its readiness and duration.
+
+    Critical steps are retried with backoff (STARTUP_RETRY_ATTEMPTS), so a
+    worker that loses a start-up race, such as the one for the sessions
+    database lock, recovers instead of answering 503 for its whole life.
+    """
+    attempts = max(1, STARTUP_RETRY_ATTEMPTS) if startup_status[name]["critical"] else 1
+    start = time.perf_counter()
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                await init()
+                startup_status[name]["ready"] = True
+                startup_status[name]["error"] = None
+                break
+            except Exception as e:
+                startup_status[name]["error"] = str(e)
+                print(f" {name} failed to initialize (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 8))
+    finally:
+        startup_status[name]["init_seconds"] = round(time.perf_counter() - start, 3)
+        print(f" {name} init took {startup_status[name]['init_seconds']}s")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize agent on startup."""
-    await setup_agent()
+    # The RAG system (embedding model + Chroma) loads in the background; until
+    # it is ready, product questions get a "still loading" answer
+    rag_task = asyncio.create_task(init_component("rag", lambda: asyncio.to_thread(setup_rag_retriever)))
+    startup_tasks.add(rag_task)
+    rag_task.add_done_callback(startup_tasks.discard)
+    
+    await init_component("agent", setup_agent)
+    if startup_status["agent"]["ready"]:
+        await init_component("transaction_tools", warm_transaction_tools)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT token."""
@@ -216,21 +470,186 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token."""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    with stage("auth"):
+        try:
+            token = credentials.credentials
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authentication credentials"
+                )
+            return username
+        except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials"
             )
-        return username
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
+
+def rate_limited_customer(username: str = Depends(verify_token)) -> str:
+    """Verify the token and spend one of the customer's rate-limit tokens."""
+    with stage("rate_limit"):
+        rate_limiter.check(username)
+    return username
+
+async def ensure_session(user_id: str) -> str:
+    """Get or create the conversation session for a user."""
+    session_id = f"session_{user_id}"
+    with stage("session"):
+        session = await session_service.get_session(
+            app_name="bank_agent",
+            user_id=user_id,
+            session_id=session_id
         )
+        if session is None:
+            try:
+                await session_service.create_session(
+                    app_name="bank_agent",
+                    user_id=user_id,
+                    session_id=session_id
+                )
+            except Exception:
+                pass  # Created concurrently by another request
+    return session_id
+
+def extract_final_text(event) -> str:
+    """Join the text parts of a final response event."""
+    texts = []
+    for part in event.content.parts:
+        if getattr(part, "text", None):
+            texts.append(part.text)
+    return "\n".join(texts).strip()
+
+async def stream_agent_events(user_id: str, username: str, query_text: str, run_config: Optional[RunConfig] = None):
+    """Yield ADK events for one conversation turn as the runner produces them (caller holds an admission slot)."""
+    session_id = await ensure_session(user_id)
+    
+    context_query = f"[Customer ID: {username}] {query_text}"
+    
+    content = types.Content(
+        role="user",
+        parts=[types.Part(text=context_query)]
+    )
+    
+    try:
+        async for event in runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=content,
+            run_config=run_config
+        ):
+            yield event
+    finally:
+        await session_service.flush()  # persist the turn even if it ended early
+
+async def answer_routed_intent(user_id: str, username: str, query_text: str):
+    """Answer a simple balance or transaction question with one direct tool call.
+    
+    Returns (intent, result, answer), or None when the query needs the agent.
+    The turn is recorded in the session so follow-up questions keep their context.
+    """
+    intent = route(query_text, username)
+    if intent is not None:
+        try:
+            tool = mcp_server.run_in_tool_pool(getattr(mcp_server, intent.tool))
+            start = time.perf_counter()
+            result = await tool(**intent.args)
+            record_tool_call(intent.tool, time.perf_counter() - start)
+        except Exception as e:
+            print(f"Intent fast path failed for {intent.tool}, using the agent: {e}")
+            intent = None
+    intent_stats.record(intent.tool if intent else None)
+    if intent is None:
+        return None
+    
+    answer = render(intent, result)
+    session_id = await ensure_session(user_id)
+    session = await session_service.get_session(app_name="bank_agent", user_id=user_id, session_id=session_id)
+    for event in turn_events(agent.name, f"[Customer ID: {username}] {query_text}", intent, result, answer):
+        await session_service.append_event(session, event)
+    await session_service.flush()
+    return intent, result, answer
+
+def lookup_cached_answer(query_text: str):
+    """Embed a query and look it up in the semantic answer cache."""
+    reload_rag_if_rebuilt()
+    query_embedding = embed_query(query_text)
+    return query_embedding, answer_cache.lookup(query_embedding, rag_catalog_version)
+
+async def session_has_customer_data(user_id: str) -> bool:
+    """True if the conversation history sent to the model holds results of transaction tools."""
+    session = await session_service.get_session(app_name="bank_agent", user_id=user_id, session_id=f"session_{user_id}")
+    return session is not None and any(
+        call.name not in PRODUCT_ONLY_TOOLS for event in session.events for call in event.get_function_calls()
+    )
+
+async def run_agent(user_id: str, username: str, query_text: str) -> str:
+    """Run one conversation turn through the ADK runner without blocking the event loop."""
+    if INTENT_ROUTER_ENABLED:
+        routed = await answer_routed_intent(user_id, username, query_text)
+        if routed is not None:
+            return routed[2]
+    
+    # The cache is shared by all customers: only stand-alone questions asked without
+    # customer data in the history may read or write it
+    query_embedding = None
+    if (SEMANTIC_CACHE_ENABLED and embed_model is not None and not depends_on_context(query_text)
+            and not await session_has_customer_data(user_id)):
+        with stage("semantic_cache"):
+            query_embedding, cached_answer = await asyncio.to_thread(lookup_cached_answer, query_text)
+        if cached_answer is not None:
+            return cached_answer
+    
+    response_text = ""
+    tools_used = set()
+    queued_at = time.perf_counter()
+    async with admission.slot():
+        record_stage("admission_wait", time.perf_counter() - queued_at)
+        with stage("agent"):
+            async for event in stream_agent_events(user_id, username, query_text):
+                tools_used.update(call.name for call in event.get_function_calls())
+                if event.is_final_response() and event.content and event.content.parts:
+                    response_text = extract_final_text(event)
+    
+    # Never cache answers built from customer data (MCP transaction tools)
+    if query_embedding is not None and response_text and tools_used and tools_used <= PRODUCT_ONLY_TOOLS:
+        answer_cache.add(query_embedding, response_text, rag_catalog_version)
+    
+    return response_text
+
+async def run_agent_coalesced(user_id: str, username: str, query_text: str) -> str:
+    """Run one turn, sharing it with identical requests already in flight for the same customer and session."""
+    if not QUERY_COALESCING_ENABLED:
+        return await run_agent(user_id, username, query_text)
+    key = (username, user_id, normalize_query(query_text))
+    return await query_flights.do(key, lambda: run_agent(user_id, username, query_text))
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Streaming response that returns its admission slot when the response ends, however it ends.
+    
+    The slot is held from before the response is built, so releasing it from the body
+    generator would leak it when the client disconnects before the body starts.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release()
+
+def format_sse(event_type: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request, exc: RateLimited):
+    """Turn rate-limit and overload rejections into 429 with Retry-After."""
+    return JSONResponse(
+        {"detail": exc.reason},
+        status_code=429,
+        headers={"Retry-After": exc.retry_after_header}
+    )
 
 @app.post("/login", response_model=Token)
 async def login(request: LoginRequest):
@@ -253,103 +672,102 @@ async def login(request: LoginRequest):
 @app.post("/query", response_model=QueryResponse)
 async def query_agent(
     request: QueryRequest,
-    username: str = Depends(verify_token)
+    username: str = Depends(rate_limited_customer)
 ):
     """Query the banking agent (text)."""
-    global runner, session_service
-    
     if not runner:
         raise HTTPException(status_code=503, detail="Agent not initialized")
     
+    response_text = await run_agent_coalesced(request.user_id, username, request.query)
     
-    try:
-        await session_service.create_session(
-            app_name="bank_agent",
-            user_id=request.user_id,
-            session_id=f"session_{request.user_id}"
-        )
-    except:
-        pass  
-    
-    
-    
-    context_query = f"[Customer ID: {username}] {request.query}"
-    
-    content = types.Content(
-        role="user",
-        parts=[types.Part(text=context_query)]
-    )
+    return QueryResponse(response=response_text, user_id=request.user_id)
+
+@app.post("/query/stream")
+async def query_agent_stream(
+    request: QueryRequest,
+    username: str = Depends(rate_limited_customer)
+):
+    """Query the banking agent and stream its events as server-sent events."""
+    if not runner:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
     
-    events = runner.run(
-        user_id=request.user_id,
-        session_id=f"session_{request.user_id}",
-        new_message=content
+    routed = await answer_routed_intent(request.user_id, username, request.query) if INTENT_ROUTER_ENABLED else None
+    if routed is not None:
+        intent, result, answer = routed
+        events = [
+            format_sse("tool_call", {"name": intent.tool, "args": intent.args}),
+            format_sse("tool_result", {"name": intent.tool}),
+            format_sse("final", {"response": answer, "user_id": request.user_id}),
+            format_sse("done", {})
+        ]
+        return StreamingResponse(iter(events), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+    with stage("admission_wait"):
+        await admission.acquire()  # reject with 429 before the stream starts
+    
+    async def event_stream():
+        agent_started = time.perf_counter()
+        try:
+            async for event in stream_agent_events(request.user_id, username, request.query, run_config):
+                for call in event.get_function_calls():
+                    yield format_sse("tool_call", {"name": call.name, "args": call.args or {}})
+                for result in event.get_function_responses():
+                    yield format_sse("tool_result", {"name": result.name})
+                
+                if not (event.content and event.content.parts):
+                    continue
+                if event.partial:
+                    text = "".join(part.text for part in event.content.parts if getattr(part, "text", None))
+                    if text:
+                        yield format_sse("delta", {"text": text})
+                elif event.is_final_response():
+                    yield format_sse("final", {
+                        "response": extract_final_text(event),
+                        "user_id": request.user_id
+                    })
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+        finally:
+            record_stage("agent", time.perf_counter() - agent_started)
+        yield format_sse("done", {})
+    
+    return AdmittedStreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-   
-    response_text = ""
-    for event in events:
-        if event.is_final_response():
-            texts = []
-            for part in event.content.parts:
-                if getattr(part, "text", None):
-                    texts.append(part.text)
-            response_text = "\n".join(texts).strip()
-            break
-    
-    return QueryResponse(response=response_text, user_id=request.user_id)
 
 @app.post("/query/voice", response_model=QueryResponse)
 async def query_agent_voice(
+    response: Response,
     audio: UploadFile = File(...),
     user_id: str = "user123",
-    username: str = Depends(verify_token)
+    username: str = Depends(rate_limited_customer)
 ):
     """Query the banking agent with voice input."""
-    global runner, session_service
-    
     if not runner:
         raise HTTPException(status_code=503, detail="Agent not initialized")
     
-    
-    query_text = transcribe_audio(audio)
-    print(f"Transcribed: {query_text}")
-    
-    
+    # The upload is already spooled by Starlette; decode it in place off the event loop
     try:
-        await session_service.create_session(
-            app_name="bank_agent",
-            user_id=user_id,
-            session_id=f"session_{user_id}"
+        with stage("transcribe"):
+            query_text, timings = await transcriber.transcribe(audio.file)
+    except TranscriptionError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Audio transcription failed: {str(e)}"
         )
-    except:
-        pass
-    
-  
-    context_query = f"[Customer ID: {username}] {query_text}"
-    
-    content = types.Content(
-        role="user",
-        parts=[types.Part(text=context_query)]
-    )
-    
-    
-    events = runner.run(
-        user_id=user_id,
-        session_id=f"session_{user_id}",
-        new_message=content
-    )
+    finally:
+        await audio.close()
+    print(f"Transcribed: {query_text}")
     
-    # Extract response
-    response_text = ""
-    for event in events:
-        if event.is_final_response():
-            texts = []
-            for part in event.content.parts:
-                if getattr(part, "text", None):
-                    texts.append(part.text)
-            response_text = "\n".join(texts).strip()
-            break
+    start = time.perf_counter()
+    response_text = await run_agent_coalesced(user_id, username, query_text)
+    timings["agent"] = (time.perf_counter() - start) * 1000
     
+    response.headers["Server-Timing"] = server_timing(timings)
+    print("Voice timings: " + ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in timings.items()))
     return QueryResponse(response=response_text, user_id=user_id)
 
 
@@ -359,15 +777,46 @@ async def root():
     """Health check endpoint."""
     return {"status": "online", "service": "Banking Agent API"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker (text exposition format)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health():
-    """Detailed health check."""
-    return {
-        "status": "healthy",
+    """Detailed health check (503 until the critical components are ready)."""
+    critical_ready = all(c["ready"] for c in startup_status.values() if c["critical"])
+    all_ready = all(c["ready"] for c in startup_status.values())
+    body = {
+        "status": "healthy" if all_ready else "degraded" if critical_ready else "starting",
+        "components": startup_status,
         "agent_ready": agent is not None,
-        "runner_ready": runner is not None
+        "runner_ready": runner is not None,
+        "mcp_tool_mode": MCP_TOOL_MODE,
+        "embed_backend": EMBED_BACKEND,
+        "rag_backend": RAG_BACKEND,
+        "voice_backend": VOICE_BACKEND,
+        "sessions": session_service.stats() if session_service is not None else None,
+        "admission": {
+            **admission.stats(),
+            "rate_limit_per_minute": RATE_LIMIT_PER_MINUTE,
+            "rate_limit_burst": RATE_LIMIT_BURST,
+            "rejected_rate_limit": rate_limiter.rejected
+        },
+        "coalescing": {"enabled": QUERY_COALESCING_ENABLED, **query_flights.stats()},
+        "intent_router": {"enabled": INTENT_ROUTER_ENABLED, **intent_stats.stats()},
+        "rag_cache": {
+            "catalog_version": rag_catalog_version,
+            "embeddings": embedding_cache.stats(),
+            "retrievals": retrieval_cache.stats(),
+            "answers": answer_cache.stats(),
+            "lexical": lexical_stats.stats()
+        }
     }
+    return JSONResponse(body, status_code=200 if critical_ready else 503)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if API_WORKERS > 1 and SESSION_BACKEND != "sqlite":
+        print("Warning: with SESSION_BACKEND=memory each worker has its own conversations; use SESSION_BACKEND=sqlite")
+    uvicorn.run("api_server:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from jose import jwt
+
+from bench_embeddings import PRODUCT_QUESTIONS
+from bench_voice import make_wav
+from catalog import read_catalog_version
+from database import generate_database
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+TRANSACTION_QUESTIONS = [
+    "What is my checking balance?",
+    "What's my savings balance?",
+    "Show my last transaction in checking",
+    "What was the last transaction on my savings account?",
+    "Show my recent checking transactions",
+    "What have I spent recently from savings? Show the transactions",
+    "Give me an overview of my accounts",
+    "How am I doing overall?",
+]
+
+SCENARIOS = ["login", "query_transaction", "query_product", "voice"]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[max(0, min(len(values) - 1, int(round(q * len(values))) - 1))]
+
+
+def make_token(secret: str, customer_id: str) -> str:
+    """A JWT for a synthetic customer, signed the way /login signs them."""
+    expires = datetime.now(timezone.utc) + timedelta(hours=2)
+    return jwt.encode({"sub": customer_id, "exp": expires}, secret, algorithm="HS256")
+
+
+def start_server(args, db_path: str, secret: str, log_file) -> subprocess.Popen:
+    """Run api_server under uvicorn with the stub model and local tools."""
+    env = {
+        **os.environ,
+        "AGENT_MODEL": "stub",
+        "STUB_LLM_LATENCY_MS": str(args.stub_latency_ms),
+        "JWT_SECRET_KEY": secret,
+        "BANK_DB_PATH": db_path,
+        "CHROMA_PATH": args.chroma_path,
+        "MCP_TOOL_MODE": args.tool_mode,
+        "VOICE_BACKEND": "stub",
+        "VOICE_STUB_TEXT": "What is my checking balance?",
+        "INTENT_ROUTER_ENABLED": "true" if args.intent_router else "false",
+        "SEMANTIC_CACHE_ENABLED": "false",
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "AGENT_MAX_QUEUE": str(max(args.concurrency) * 2),
+        "AGENT_QUEUE_TIMEOUT_SECONDS": "120",
+        "METRICS_LOG_REQUESTS": "false",
+    }
+    command = [sys.executable, "-m", "uvicorn", "api_server:app", "--host", "127.0.0.1",
+               "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float) -> dict:
+    """Wait for /health to report the agent and the RAG system ready; return the last health body."""
+    deadline = time.monotonic() + timeout
+    health = {}
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"api_server exited with code {server.returncode}")
+        try:
+            health = httpx.get(f"{base_url}/health", timeout=2).json()
+            if health.get("status") == "healthy":
+                return health
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    if health.get("agent_ready"):
+        print(f" RAG not ready after {timeout:.0f}s, product queries will measure the loading reply")
+        return health
+    raise RuntimeError(f"api_server not ready after {timeout:.0f}s")
+
+
+def final_health(base_url: str) -> dict:
+    """The /health body after the run (its counters come from whichever worker answers)."""
+    try:
+        return httpx.get(f"{base_url}/health", timeout=10).json()
+    except httpx.HTTPError:
+        return {}
+
+
+def build_request(scenario: str, rng: random.Random, customers: list, tokens: dict, audio: bytes) -> dict:
+    """httpx.request keyword arguments for one request of a scenario."""
+    if scenario == "login":
+        return {"method": "POST", "url": "/login", "json": {"username": "user123", "password": "password123"}}
+    customer = rng.choice(customers)
+    headers = {"Authorization": f"Bearer {tokens[customer]}"}
+    if scenario == "voice":
+        return {"method": "POST", "url": "/query/voice", "headers": headers, "params": {"user_id": customer},
+                "files": {"audio": ("question.wav", audio, "audio/wav")}}
+    questions = TRANSACTION_QUESTIONS if scenario == "query_transaction" else PRODUCT_QUESTIONS
+    return {"method": "POST", "url": "/query", "headers": headers,
+            "json": {"query": rng.choice(questions), "user_id": customer}}
+
+
+async def run_level(client: httpx.AsyncClient, requests: list, concurrency: int) -> dict:
+    """Send the requests with at most concurrency in flight and summarize latency and throughput."""
+    gate = asyncio.Semaphore(concurrency)
+    latencies, errors = [], {}
+
+    async def one(request):
+        async with gate:
+            start = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(request) for request in requests))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "rps": round(len(requests) / elapsed, 1),
+    }
+
+
+async def run_benchmark(args, base_url: str, customers: list, tokens: dict) -> list:
+    rng = random.Random(args.seed)
+    audio = make_wav(args.voice_seconds)
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        for scenario in args.scenarios:
+            # Warm-up: first session creation, tool server start-up and RAG caches
+            await run_level(client, [build_request(scenario, rng, customers, tokens, audio) for _ in range(5)], 1)
+            for concurrency in args.concurrency:
+                requests = [build_request(scenario, rng, customers, tokens, audio) for _ in range(args.requests)]
+                row = {"scenario": scenario, "concurrency": concurrency, **await run_level(client, requests, concurrency)}
+                results.append(row)
+                print(f"{scenario:>18} {concurrency:>5} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                      f"{row['p99_ms']:>9.1f} {row['rps']:>8.1f} {sum(row['errors'].values()):>7}")
+    return results
+
+
+def compare_to_baseline(results: list, baseline_path: str, tolerance: float) -> list:
+    """Return (scenario, concurrency, metric, baseline, current) for every regression beyond tolerance."""
+    with open(baseline_path) as f:
+        baseline = {(row["scenario"], row["concurrency"]): row for row in json.load(f)["results"]}
+    regressions = []
+    for row in results:
+        before = baseline.get((row["scenario"], row["concurrency"]))
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if row[metric] > before[metric] * (1 + tolerance):
+                regressions.append((row["scenario"], row["concurrency"], metric, before[metric], row[metric]))
+        if row["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append((row["scenario"], row["concurrency"], "rps", before["rps"], row["rps"]))
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end API benchmark with a stub model and local tools")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--customers", type=int, default=1000, help="Synthetic customers in the ledger")
+    parser.add_argument("--transactions-per-account", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tool-mode", choices=["stdio", "inprocess"], default="stdio",
+                        help="MCP_TOOL_MODE for the server (stdio runs mcp_server.py as a subprocess)")
+    parser.add_argument("--intent-router", action="store_true",
+                        help="Let simple transaction questions skip the model (off: every query runs the agent)")
+    parser.add_argument("--stub-latency-ms", type=float, default=0, help="Simulated latency per model call")
+    parser.add_argument("--voice-seconds", type=float, default=3.0, help="Length of the uploaded voice clip")
+    parser.add_argument("--chroma-path", default=os.path.join(ROOT, "chroma_db"),
+                        help="Product index (built with setup_rag.py from bank_products if missing)")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--output", default="bench_e2e_results.json", help="Machine-readable results file")
+    parser.add_argument("--baseline", help="Earlier results file; exit 1 if any metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression against the baseline")
+    parser.add_argument("--keep-workdir", action="store_true",
+                        help="Keep the generated ledger and server log (always kept when the run fails)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    db_path = os.path.join(workdir, "bank_data.db")
+    generate_database(db_path, customers=args.customers,
+                      transactions_per_account=args.transactions_per_account, seed=args.seed)
+
+    if not read_catalog_version(args.chroma_path) and args.chroma_path == os.path.join(ROOT, "chroma_db"):
+        print(" Building the product index from bank_products...")
+        subprocess.run([sys.executable, "setup_rag.py"], cwd=ROOT, check=True)
+
+    secret = secrets.token_hex(32)
+    customers = [f"user{n}" for n in range(1, args.customers + 1)]
+    tokens = {customer: make_token(secret, customer) for customer in customers}
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    log_path = os.path.join(workdir, "api_server.log")
+    with open(log_path, "w") as log_file:
+        server = start_server(args, db_path, secret, log_file)
+        try:
+            health = wait_until_ready(base_url, server, args.ready_timeout)
+            print(f"\nServer ready ({args.workers} worker(s), tools {args.tool_mode}, "
+                  f"intent router {'on' if args.intent_router else 'off'}); log: {log_path}\n")
+            print(f"{'scenario':>18} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>7}")
+            results = asyncio.run(run_benchmark(args, base_url, customers, tokens))
+            stats = final_health(base_url)
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    if args.keep_workdir:
+        print(f"\nLedger and server log kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "keep_workdir")},
+        "server": {
+            **{key: health.get(key) for key in ("status", "mcp_tool_mode", "embed_backend", "rag_backend")},
+            "intent_router": stats.get("intent_router"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for scenario, concurrency, metric, before, after in regressions:
+            print(f" REGRESSION {scenario} @ {concurrency}: {metric} {before} -> {after}")
+        if regressions:
+            sys.exit(1)
+        print(f" No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
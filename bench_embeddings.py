@@ -0,0 +1,176 @@
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from embeddings import EMBED_BACKENDS, EMBED_MODEL_NAME
+
+# Product questions customers actually ask the agent
+PRODUCT_QUESTIONS = [
+    "What credit cards do you offer?",
+    "Which card has no annual fee?",
+    "What is the APR on the premium rewards card?",
+    "Do any cards charge a foreign transaction fee?",
+    "Is there a credit card for students?",
+    "Which card gives airport lounge access?",
+    "How much can I borrow with a personal loan?",
+    "What are the mortgage interest rates?",
+    "How much down payment do I need for a house?",
+    "Do you have special rates for electric cars?",
+    "Can I refinance my student loans?",
+    "Is there a prepayment penalty on personal loans?",
+    "What interest does the high-yield savings account pay?",
+    "What is the minimum deposit to open a savings account?",
+    "Are my savings FDIC insured?",
+    "What are your CD rates?",
+    "Tell me about the money market account",
+    "What is the best account for my emergency fund?",
+    "Do you offer business travel rewards?",
+    "Do you have a pet insurance plan?",
+]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_chunks(products_dir: str, chunk_size: int) -> list:
+    """Split the product files into chunks for the ranking comparison."""
+    from llama_index.core import SimpleDirectoryReader
+    from llama_index.core.node_parser import SentenceSplitter
+
+    documents = SimpleDirectoryReader(products_dir).load_data()
+    nodes = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=0).get_nodes_from_documents(documents)
+    return [node.get_content() for node in nodes]
+
+
+def run_worker(args):
+    """Measure one backend in a fresh process and print the results as JSON."""
+    from embeddings import create_embed_model
+
+    chunks = load_chunks(args.products_dir, args.chunk_size)
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    model = create_embed_model(args.worker, model_name=args.model, threads=args.threads)
+    model.get_query_embedding("warm up")
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunk_embeddings = model.get_text_embedding_batch(chunks)
+    chunks_per_sec = len(chunks) / (time.perf_counter() - start)
+
+    latencies = []
+    for _ in range(args.repeats):
+        for question in PRODUCT_QUESTIONS:
+            start = time.perf_counter()
+            model.get_query_embedding(question)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    print(json.dumps({
+        "backend": args.worker,
+        "load_seconds": load_seconds,
+        "query_p50_ms": statistics.median(latencies) * 1000,
+        "query_p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "chunks_per_sec": chunks_per_sec,
+        "rss_mb": peak_rss_mb(),
+        "model_rss_mb": peak_rss_mb() - baseline_rss,
+        "questions": [model.get_query_embedding(q) for q in PRODUCT_QUESTIONS],
+        "chunks": chunk_embeddings,
+    }))
+
+
+def measure_backend(backend: str, args) -> dict:
+    """Run the worker for one backend in a subprocess so RSS is not shared between backends."""
+    command = [sys.executable, __file__, "--worker", backend, "--model", args.model,
+               "--products-dir", args.products_dir, "--chunk-size", str(args.chunk_size),
+               "--repeats", str(args.repeats), "--threads", str(args.threads)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"{backend} backend failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare_rankings(reference: dict, candidate: dict, index: dict, top_k: int) -> dict:
+    """
+    Compare candidate query rankings against the reference backend's.
+
+    Candidate queries are scored against the chunk vectors in index, which
+    is either the candidate's own vectors (a full rebuild on the new backend)
+    or the reference's (only the API switched backend). Returns the share of
+    questions with the same top chunk, the mean top-k overlap, and the largest
+    cosine score difference on the reference's top-k chunks.
+    """
+    ref_scores = np.array(reference["questions"]) @ np.array(reference["chunks"]).T
+    new_scores = np.array(candidate["questions"]) @ np.array(index["chunks"]).T
+
+    top1 = overlap = max_delta = 0.0
+    for ref_row, new_row in zip(ref_scores, new_scores):
+        ref_top = np.argsort(-ref_row)[:top_k]
+        new_top = np.argsort(-new_row)[:top_k]
+        top1 += ref_top[0] == new_top[0]
+        overlap += len(set(ref_top) & set(new_top)) / len(ref_top)
+        max_delta = max(max_delta, float(np.abs(ref_row[ref_top] - new_row[ref_top]).max()))
+    return {
+        "top1_agreement": top1 / len(ref_scores),
+        "topk_overlap": overlap / len(ref_scores),
+        "max_score_delta": max_delta,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends: latency, memory and retrieval rankings")
+    parser.add_argument("--backends", nargs="+", choices=EMBED_BACKENDS, default=EMBED_BACKENDS,
+                        help="Backends to measure; the first is the ranking reference")
+    parser.add_argument("--model", default=EMBED_MODEL_NAME, help="Model repo or local model folder")
+    parser.add_argument("--products-dir", default="bank_products")
+    parser.add_argument("--chunk-size", type=int, default=128,
+                        help="Chunk size for the ranking check (smaller than the index's for a stricter comparison)")
+    parser.add_argument("--top-k", type=int, default=3, help="Chunks compared per question (the retriever's top_k)")
+    parser.add_argument("--repeats", type=int, default=20, help="Passes over the questions for latency")
+    parser.add_argument("--threads", type=int, default=1, help="Inference threads per backend (0 = library default)")
+    parser.add_argument("--min-top1", type=float, default=0.9, help="Minimum share of questions with the same top chunk")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="Minimum mean top-k overlap")
+    parser.add_argument("--max-score-delta", type=float, default=0.05, help="Maximum cosine score difference")
+    parser.add_argument("--worker", choices=EMBED_BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = [measure_backend(backend, args) for backend in args.backends]
+    print(f"{len(PRODUCT_QUESTIONS)} questions, {len(results[0]['chunks'])} chunks, {args.threads} thread(s)\n")
+    print(f"{'backend':>10} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'chunks/s':>9} {'RSS MB':>8} {'model MB':>9}")
+    for r in results:
+        print(f"{r['backend']:>10} {r['load_seconds']:>8.2f} {r['query_p50_ms']:>8.2f} {r['query_p95_ms']:>8.2f} "
+              f"{r['chunks_per_sec']:>9.0f} {r['rss_mb']:>8.0f} {r['model_rss_mb']:>9.0f}")
+
+    reference = results[0]
+    ok = True
+    print(f"\nRanking agreement with {reference['backend']} (top {args.top_k}):")
+    print(f"{'backend':>10} {'index':>10} {'top-1':>7} {'overlap':>8} {'max Δ':>7}")
+    for candidate in results[1:]:
+        for index in (candidate, reference):
+            check = compare_rankings(reference, candidate, index, args.top_k)
+            passed = (check["top1_agreement"] >= args.min_top1
+                      and check["topk_overlap"] >= args.min_overlap
+                      and check["max_score_delta"] <= args.max_score_delta)
+            ok = ok and passed
+            print(f"{candidate['backend']:>10} {index['backend']:>10} {check['top1_agreement']:>7.2f} "
+                  f"{check['topk_overlap']:>8.2f} {check['max_score_delta']:>7.3f}  {'PASS' if passed else 'FAIL'}")
+
+    print("\n✅ Backends agree within tolerance" if ok else "\n❌ Rankings differ beyond tolerance")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import statistics
+import time
+
+import mcp_server
+from intent_router import render, route
+
+# Representative customer questions and the tool that should answer them
+# (None = must go to the agent: products, periods, other customers, several intents)
+SAMPLE_QUERIES = [
+    ("What's my checking balance?", "calculate_account_balance"),
+    ("How much money do I have in savings?", "calculate_account_balance"),
+    ("checking balance please", "calculate_account_balance"),
+    ("What is my balance?", "get_account_summary"),
+    ("Show me my balances", "get_account_summary"),
+    ("Show my last savings transaction", "get_last_transaction"),
+    ("What was my most recent checking purchase?", "get_last_transaction"),
+    ("latest checking transaction", "get_last_transaction"),
+    ("Show my last 3 checking transactions", "get_recent_transactions"),
+    ("List my recent savings transactions", "get_recent_transactions"),
+    ("Show me five recent checking payments", "get_recent_transactions"),
+    ("How much is in checking right now?", "calculate_account_balance"),
+    ("What is the interest rate on the high-yield savings account?", None),
+    ("Do you offer pet insurance?", None),
+    ("What did I spend on restaurants in December?", None),
+    ("Show my checking transactions on 2026-01-09", None),
+    ("What is user456's checking balance?", None),
+    ("Compare my checking and savings balances", None),
+    ("Why was I charged an internet bill?", None),
+    ("Can I afford a $500 purchase?", None),
+    ("What's my savings balance and my last checking transaction?", None),
+    ("Transfer $200 from checking to savings", None),
+    ("How much is it?", None),
+    ("Is there money?", None),
+    ("Show all my checking transactions", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the intent fast path hit rate and latency")
+    parser.add_argument("--customer", default="user123")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed runs per routed query")
+    parser.add_argument("--show", action="store_true", help="Print every query's route and answer")
+    args = parser.parse_args()
+
+    routed, wrong, latencies = 0, [], []
+    for query, expected in SAMPLE_QUERIES:
+        intent = route(query, args.customer)
+        tool = intent.tool if intent else None
+        if tool != expected:
+            wrong.append((query, expected, tool))
+        if intent is None:
+            if args.show:
+                print(f"{'agent':>26}  {query}")
+            continue
+        routed += 1
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            intent = route(query, args.customer)
+            answer = render(intent, getattr(mcp_server, intent.tool)(**intent.args))
+            timings.append((time.perf_counter() - start) * 1000)
+        latencies.extend(timings)
+        if args.show:
+            print(f"{tool:>26}  {query}\n{'':>28}{answer.splitlines()[0]}")
+
+    latencies.sort()
+    print(f"\nFast path hit rate: {routed}/{len(SAMPLE_QUERIES)} ({routed / len(SAMPLE_QUERIES):.0%})")
+    print(f"Fast path latency (route + tool + render): p50 {statistics.median(latencies):.3f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms")
+    if wrong:
+        print("\nUnexpected routes:")
+        for query, expected, tool in wrong:
+            print(f"  {query!r}: expected {expected or 'agent'}, got {tool or 'agent'}")
+    else:
+        print("All queries routed as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mcp_server
+from mcp_server import ConnectionPool
+
+
+def sample_customers(db_path: str, limit: int = 1000) -> list:
+    """Pick customer IDs that have transactions."""
+    with ConnectionPool(db_path, 0).connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT customer_id FROM transactions LIMIT ?", (limit,)
+        ).fetchall()
+    return [row["customer_id"] for row in rows]
+
+
+def make_workload(customers: list, calls: int, seed: int) -> list:
+    """Build a mixed list of (tool, kwargs) calls."""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(calls):
+        customer_id = rng.choice(customers)
+        account_type = rng.choice(["checking", "savings"])
+        kind = rng.random()
+        if kind < 0.4:
+            workload.append((mcp_server.calculate_account_balance,
+                             {"customer_id": customer_id, "account_type": account_type}))
+        elif kind < 0.7:
+            workload.append((mcp_server.get_last_transaction,
+                             {"customer_id": customer_id, "account_type": account_type}))
+        elif kind < 0.9:
+            workload.append((mcp_server.get_recent_transactions,
+                             {"customer_id": customer_id, "account_type": account_type, "limit": 5}))
+        else:
+            workload.append((mcp_server.get_transactions_by_date,
+                             {"customer_id": customer_id, "account_type": account_type, "date": "2026-01-09"}))
+    return workload
+
+
+def run_benchmark(db_path: str, pool_size: int, concurrency: int, workload: list) -> dict:
+    """Run the workload against a pool of the given size and return throughput stats."""
+    mcp_server.db_pool.close()
+    mcp_server.db_pool = ConnectionPool(db_path, pool_size)
+
+    def call(item):
+        tool, kwargs = item
+        start = time.perf_counter()
+        tool(**kwargs)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, workload))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "pool_size": pool_size,
+        "concurrency": concurrency,
+        "calls_per_sec": len(workload) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MCP tool calls per second")
+    parser.add_argument("--db", default=mcp_server.DB_PATH, help="SQLite database to query")
+    parser.add_argument("--calls", type=int, default=20000, help="Tool calls per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8],
+                        help="Concurrent callers to test")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 8],
+                        help="Pool sizes to test (0 = new connection per call, the old behavior)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    customers = sample_customers(args.db)
+    if not customers:
+        raise SystemExit(f"No transactions found in {args.db}; run database.py first")
+    workload = make_workload(customers, args.calls, args.seed)
+
+    print(f"Database: {args.db} ({len(customers)} sampled customers, {args.calls} calls per run)\n")
+    print(f"{'pool':>6} {'callers':>8} {'calls/sec':>12} {'p50 ms':>9} {'p95 ms':>9}")
+    for pool_size in args.pool_sizes:
+        for concurrency in args.concurrency:
+            result = run_benchmark(args.db, pool_size, concurrency, workload)
+            print(f"{result['pool_size']:>6} {result['concurrency']:>8} "
+                  f"{result['calls_per_sec']:>12.0f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
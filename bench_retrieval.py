@@ -0,0 +1,83 @@
+import argparse
+import statistics
+import sys
+import time
+
+from bench_embeddings import PRODUCT_QUESTIONS
+from catalog import active_collection_name
+from embeddings import EMBED_BACKEND, EMBED_BACKENDS, create_embed_model
+from vector_index import NumpyVectorIndex
+
+# Same relevance cutoff as query_product_knowledge in api_server.py
+SCORE_CUTOFF = 0.3
+
+
+def time_calls(fn, items, repeats: int) -> list:
+    """Call fn on every item repeats times and return sorted latencies in seconds."""
+    latencies = []
+    for _ in range(repeats):
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Chroma and NumPy product retrievers")
+    parser.add_argument("--chroma-path", default="./chroma_db")
+    parser.add_argument("--embed-backend", choices=EMBED_BACKENDS, default=EMBED_BACKEND)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=50, help="Passes over the questions for latency")
+    parser.add_argument("--max-score-delta", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    import chromadb
+    from llama_index.core import QueryBundle, VectorStoreIndex
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
+    collection_name = active_collection_name(args.chroma_path)
+    embed_model = create_embed_model(args.embed_backend)
+    bundles = [QueryBundle(query_str=q, embedding=embed_model.get_query_embedding(q)) for q in PRODUCT_QUESTIONS]
+
+    collection = chromadb.PersistentClient(path=args.chroma_path).get_collection(collection_name)
+    index = VectorStoreIndex.from_vector_store(ChromaVectorStore(chroma_collection=collection),
+                                               embed_model=embed_model)
+    chroma = index.as_retriever(similarity_top_k=args.top_k)
+    numpy_index = NumpyVectorIndex.load(args.chroma_path, collection_name, similarity_top_k=args.top_k)
+
+    ok = True
+    for bundle in bundles:
+        expected = chroma.retrieve(bundle)
+        actual = numpy_index.retrieve(bundle)
+        same_chunks = [n.node.node_id for n in expected] == [c.node_id for c in actual]
+        delta = max((abs(n.score - c.score) for n, c in zip(expected, actual)), default=0.0)
+        same_cutoff = ([n.score >= SCORE_CUTOFF for n in expected] == [c.score >= SCORE_CUTOFF for c in actual])
+        match = same_chunks and delta <= args.max_score_delta and same_cutoff
+        ok = ok and match
+        if not match:
+            print(f"FAIL {bundle.query_str!r}: chroma {[(n.node.node_id, round(n.score, 4)) for n in expected]} "
+                  f"numpy {[(c.node_id, round(c.score, 4)) for c in actual]}")
+
+    embeddings = [bundle.embedding for bundle in bundles]
+    chroma_latencies = time_calls(chroma.retrieve, bundles, args.repeats)
+    numpy_latencies = time_calls(numpy_index.retrieve, bundles, args.repeats)
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        numpy_index.search_batch(embeddings)
+    batch_per_query = (time.perf_counter() - start) / (args.repeats * len(bundles))
+
+    print(f"Collection {collection_name}: {len(numpy_index)} chunks, {len(bundles)} questions, top {args.top_k}\n")
+    print(f"{'retriever':>12} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, latencies in (("chroma", chroma_latencies), ("numpy", numpy_latencies)):
+        print(f"{name:>12} {statistics.median(latencies) * 1000:>9.3f} "
+              f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:>9.3f}")
+    print(f"{'numpy batch':>12} {batch_per_query * 1000:>9.3f}   (per query, {len(bundles)} per batch)")
+
+    print("\n✅ NumPy retriever matches Chroma" if ok else "\n❌ Retrievers disagree")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
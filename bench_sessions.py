@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from sessions import BoundedSessionService, SqliteSessionService
+
+
+def make_turn(turn: int) -> list:
+    """Events of one agent turn: user question, tool call, tool result, answer."""
+    return [
+        Event(author="user", content=types.Content(
+            role="user", parts=[types.Part(text=f"[Customer ID: user123] What was my balance on day {turn}?")])),
+        Event(author="bank_agent", content=types.Content(role="model", parts=[types.Part(
+            function_call=types.FunctionCall(name="calculate_account_balance",
+                                             args={"customer_id": "user123", "account_type": "checking"}))])),
+        Event(author="bank_agent", content=types.Content(role="user", parts=[types.Part(
+            function_response=types.FunctionResponse(name="calculate_account_balance",
+                                                     response={"balance": 4000.0 + turn}))])),
+        Event(author="bank_agent", content=types.Content(
+            role="model", parts=[types.Part(text=f"Your checking balance is ${4000 + turn:.2f}.")])),
+    ]
+
+
+async def run_conversation(service, turns: int, report_every: int) -> list:
+    """Play a long conversation the way the runner does and time each turn's session load and writes."""
+    await service.create_session(app_name="bank_agent", user_id="user123", session_id="session_user123")
+    rows = []
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        session = await service.get_session(app_name="bank_agent", user_id="user123",
+                                            session_id="session_user123")
+        load_ms = (time.perf_counter() - start) * 1000
+        history = len(session.events)
+        prompt_chars = sum(len(str(event.content)) for event in session.events)
+        for event in make_turn(turn):
+            await service.append_event(session, event)
+        turn_ms = (time.perf_counter() - start) * 1000
+        if turn % report_every == 0:
+            rows.append((turn, history, prompt_chars, load_ms, turn_ms))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare history growth and turn cost across session services")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--history-turns", type=int, default=10)
+    parser.add_argument("--report-every", type=int, default=100)
+    args = parser.parse_args()
+
+    services = {
+        "unbounded": InMemorySessionService(),
+        "bounded": BoundedSessionService(history_turns=args.history_turns),
+        "sqlite": SqliteSessionService(os.path.join(tempfile.mkdtemp(), "sessions.db"),
+                                       history_turns=args.history_turns),
+    }
+    print(f"{'service':>10} {'turn':>6} {'events':>7} {'prompt chars':>13} {'load ms':>8} {'turn ms':>8}")
+    for name, service in services.items():
+        for turn, history, prompt_chars, load_ms, turn_ms in asyncio.run(
+                run_conversation(service, args.turns, args.report_every)):
+            print(f"{name:>10} {turn:>6} {history:>7} {prompt_chars:>13} {load_ms:>8.3f} {turn_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
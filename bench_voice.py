@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import io
+import math
+import statistics
+import struct
+import time
+import wave
+
+from voice import VOICE_BACKENDS, Transcriber
+
+
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    """A mono 16-bit WAV of a 440 Hz tone, the size of a spoken question."""
+    frames = int(seconds * sample_rate)
+    samples = (int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate)) for i in range(frames))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f"<{frames}h", *samples))
+    return buffer.getvalue()
+
+
+async def run_benchmark(transcriber: Transcriber, audio: bytes, requests: int, concurrency: int) -> tuple:
+    """Transcribe the clip requests times with at most concurrency requests in flight."""
+    gate = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one():
+        async with gate:
+            _, timings = await transcriber.transcribe(io.BytesIO(audio))
+            results.append(timings)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark voice decode and recognition without the agent")
+    parser.add_argument("--backend", choices=VOICE_BACKENDS, default="stub")
+    parser.add_argument("--workers", type=int, default=4, help="Transcription thread pool size")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the test clip")
+    args = parser.parse_args()
+
+    audio = make_wav(args.seconds)
+    transcriber = Transcriber(args.backend, args.workers)
+    results, elapsed = asyncio.run(run_benchmark(transcriber, audio, args.requests, args.concurrency))
+    transcriber.shutdown()
+
+    print(f"{args.backend} backend, {args.workers} workers, {args.concurrency} concurrent, "
+          f"{args.seconds:.0f}s clip ({len(audio) // 1024} KiB)\n")
+    print(f"{'stage':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage in results[0]:
+        values = sorted(r[stage] for r in results)
+        print(f"{stage:>10} {statistics.median(values):>9.2f} {values[int(len(values) * 0.95) - 1]:>9.2f}")
+    print(f"\n{args.requests / elapsed:.1f} transcriptions/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 900):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SemanticCache:
+    """Answer cache that matches new queries to stored ones by embedding cosine similarity.
+
+    Entries are tied to the catalog version they were answered from; a new
+    version empties the cache. Oldest entries are evicted first when full.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_size: int = 512, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.catalog_version = None
+        self._vectors = None
+        self._answers = []
+        self._expires = []
+        self._lock = threading.Lock()
+
+    def _reset(self, catalog_version):
+        self.catalog_version = catalog_version
+        self._vectors = None
+        self._answers = []
+        self._expires = []
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        if not self._expires or min(self._expires) > now:
+            return
+        keep = [i for i, expires in enumerate(self._expires) if expires > now]
+        self._vectors = self._vectors[keep] if keep else None
+        self._answers = [self._answers[i] for i in keep]
+        self._expires = [self._expires[i] for i in keep]
+
+    def _best_match(self, vector: np.ndarray):
+        """Index and score of the closest live entry, or (None, None) when empty."""
+        if self._vectors is None:
+            return None, None
+        scores = self._vectors @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def lookup(self, embedding, catalog_version):
+        """Return the cached answer closest to embedding, or None below the threshold."""
+        with self._lock:
+            if catalog_version != self.catalog_version:
+                self._reset(catalog_version)
+            self._purge_expired()
+            best, score = self._best_match(self._normalize(embedding))
+            if best is not None and score >= self.threshold:
+                self.hits += 1
+                return self._answers[best]
+            self.misses += 1
+            return None
+
+    def add(self, embedding, answer: str, catalog_version):
+        """Store an answer for the query embedding, replacing the entry for an equivalent query."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if catalog_version != self.catalog_version:
+                self._reset(catalog_version)
+            self._purge_expired()
+            vector = self._normalize(embedding)
+            expires = time.monotonic() + self.ttl_seconds
+            best, score = self._best_match(vector)
+            if best is not None and score >= self.threshold:
+                self._vectors[best] = vector
+                self._answers[best] = answer
+                self._expires[best] = expires
+                return
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._answers.append(answer)
+            self._expires.append(expires)
+            if len(self._answers) > self.max_size:
+                self._vectors = self._vectors[1:]
+                del self._answers[0]
+                del self._expires[0]
+
+    def clear(self):
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._reset(self.catalog_version)
+
+    def __len__(self):
+        return len(self._answers)
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._answers),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller starts the work as a task; callers that arrive while it is
+    still running await the same task and share its result (or exception).
+    A caller that disconnects does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Return the result of fn() (a coroutine function), shared with concurrent callers for key."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so an error nobody awaited is not logged as lost
+
+    def stats(self) -> dict:
+        """Return in-flight, execution and coalesced counters."""
+        calls = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a query for use as a cache key."""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+# Words that make a question refer back to the conversation ("what about the second one?")
+CONTEXT_WORDS = {
+    "it", "its", "that", "this", "those", "these", "them", "they", "one", "ones", "first", "second",
+    "third", "other", "others", "same", "also", "above", "previous", "else", "instead", "again",
+}
+CONTEXT_OPENERS = ("and ", "but ", "what about", "how about", "why", "so ")
+
+
+def depends_on_context(text: str) -> bool:
+    """True when a query likely refers to earlier turns, so its answer is not reusable on its own."""
+    query = normalize_query(text)
+    words = set(query.replace("?", " ").replace(",", " ").split())
+    return query.startswith(CONTEXT_OPENERS) or bool(words & CONTEXT_WORDS)
@@ -0,0 +1,55 @@
+import json
+import os
+import time
+import uuid
+
+# Files setup_rag.py keeps next to the Chroma data
+CATALOG_VERSION_FILE = "catalog_version"
+CATALOG_MANIFEST_FILE = "catalog_manifest.json"
+COLLECTION_PREFIX = "bank_products"
+
+
+def read_catalog_version(db_path: str = "./chroma_db") -> str:
+    """Return the version stamp of the last product catalog build ("" if none)."""
+    try:
+        with open(os.path.join(db_path, CATALOG_VERSION_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def write_catalog_version(db_path: str = "./chroma_db", version: str = None) -> str:
+    """Stamp a new catalog version so running API servers drop cached retrievals."""
+    version = version or new_catalog_version()
+    tmp_path = os.path.join(db_path, CATALOG_VERSION_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(db_path, CATALOG_VERSION_FILE))
+    return version
+
+
+def new_catalog_version() -> str:
+    """Return a fresh, sortable catalog version stamp."""
+    return f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+
+def read_catalog_manifest(db_path: str = "./chroma_db") -> dict:
+    """Return the manifest of the live catalog build ({} if none)."""
+    try:
+        with open(os.path.join(db_path, CATALOG_MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_catalog_manifest(db_path: str, manifest: dict):
+    """Atomically replace the catalog manifest."""
+    tmp_path = os.path.join(db_path, CATALOG_MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(db_path, CATALOG_MANIFEST_FILE))
+
+
+def active_collection_name(db_path: str = "./chroma_db") -> str:
+    """Return the Chroma collection that currently serves the product catalog."""
+    return read_catalog_manifest(db_path).get("collection", COLLECTION_PREFIX)
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import sys
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+import mcp_server
+
+# (tool name, arguments) pairs exercised in both modes
+TOOL_CALLS = [
+    ("get_last_transaction", {"customer_id": "user123", "account_type": "checking"}),
+    ("get_last_transaction", {"customer_id": "user123", "account_type": "savings"}),
+    ("get_last_transaction", {"customer_id": "user999", "account_type": "checking"}),
+    ("get_recent_transactions", {"customer_id": "user123", "account_type": "checking", "limit": 3}),
+    ("get_recent_transactions", {"customer_id": "user123", "account_type": "savings", "limit": 50}),
+    ("calculate_account_balance", {"customer_id": "user123", "account_type": "checking"}),
+    ("calculate_account_balance", {"customer_id": "user123", "account_type": "savings"}),
+    ("calculate_account_balance", {"customer_id": "user999", "account_type": "savings"}),
+    ("get_transactions_by_date", {"customer_id": "user123", "account_type": "checking", "date": "2026-01-09"}),
+    ("get_transactions_by_date", {"customer_id": "user123", "account_type": "checking", "date": "2020-01-01"}),
+    ("get_account_summary", {"customer_id": "user123"}),
+    ("get_account_summary", {"customer_id": "user999"}),
+    ("get_transactions_in_range", {"customer_id": "user123", "account_type": "checking",
+                                   "start": "2026-01-01", "end": "2026-01-31", "page_size": 2}),
+    ("get_transactions_in_range", {"customer_id": "user123", "account_type": "checking",
+                                   "start": "2026-01-01", "end": "2026-01-31", "cursor": "2026-01-09:1",
+                                   "page_size": 2}),
+    ("get_transactions_in_range", {"customer_id": "user123", "account_type": "savings",
+                                   "start": "2026-02-01", "end": "2026-01-01"}),
+]
+
+
+def stdio_payload(result) -> dict:
+    """Decode the JSON payload of an MCP tool call result."""
+    return json.loads(result.content[0].text)
+
+
+async def check_tool_modes() -> bool:
+    """Call every tool over stdio MCP and in-process and compare the payloads."""
+    tools = {tool.__name__: tool for tool in mcp_server.BANKING_TOOLS}
+    server_params = StdioServerParameters(command=sys.executable, args=["mcp_server.py"])
+
+    all_match = True
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for name, arguments in TOOL_CALLS:
+                over_stdio = stdio_payload(await session.call_tool(name, arguments))
+                in_process = tools[name](**arguments)
+                match = over_stdio == in_process
+                all_match = all_match and match
+                print(f"{'PASS' if match else 'FAIL'} {name}({arguments})")
+                if not match:
+                    print(f"  stdio:      {over_stdio}")
+                    print(f"  in-process: {in_process}")
+    return all_match
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(check_tool_modes())
+    print("\n✅ Both tool modes return identical payloads" if ok else "\n❌ Tool modes differ")
+    sys.exit(0 if ok else 1)
@@ -1,50 +1,161 @@
+import argparse
+import random
 import sqlite3
 import os
+import time
+from datetime import date, timedelta
+from itertools import islice
 
-def create_database():
-    """Create SQLite database with customers and transactions tables."""
-    
-    
-    db_path = "bank_data.db"
-    
-    
-    if os.path.exists(db_path):
-        os.remove(db_path)
-    
-  
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-   
-    cursor.execute("""
-        CREATE TABLE customers (
-            customer_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            email TEXT
+DB_PATH = os.getenv(
+    "BANK_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_data.db")
+)
+
+# Triggers that apply every ledger change to account_balances
+BALANCE_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO account_balances (customer_id, account_type, balance, txn_count)
+    VALUES (NEW.customer_id, NEW.account_type, NEW.amount, 1)
+    ON CONFLICT (customer_id, account_type) DO UPDATE
+    SET balance = balance + excluded.balance, txn_count = txn_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_balance
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE account_balances
+    SET balance = balance - OLD.amount, txn_count = txn_count - 1
+    WHERE customer_id = OLD.customer_id AND account_type = OLD.account_type;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+AFTER UPDATE OF customer_id, account_type, amount ON transactions
+BEGIN
+    UPDATE account_balances
+    SET balance = balance - OLD.amount, txn_count = txn_count - 1
+    WHERE customer_id = OLD.customer_id AND account_type = OLD.account_type;
+    INSERT INTO account_balances (customer_id, account_type, balance, txn_count)
+    VALUES (NEW.customer_id, NEW.account_type, NEW.amount, 1)
+    ON CONFLICT (customer_id, account_type) DO UPDATE
+    SET balance = balance + excluded.balance, txn_count = txn_count + 1;
+END;
+"""
+
+# Schema migrations, applied in order. The index of a migration + 1 is the
+# schema version it produces (stored in PRAGMA user_version). Never edit a
+# released migration; append a new one instead.
+MIGRATIONS = [
+    # 1: base schema
+    """
+    CREATE TABLE IF NOT EXISTS customers (
+        customer_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        email TEXT
+    );
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id TEXT NOT NULL,
+        account_type TEXT NOT NULL,
+        date TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD',
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    );
+    """,
+    # 2: covering index for the MCP tool queries (filter, order and payload columns)
+    """
+    CREATE INDEX IF NOT EXISTS idx_transactions_account_date
+    ON transactions (customer_id, account_type, date DESC, id DESC, amount, description, currency);
+    """,
+    # 3: running balances per account, kept in step with the ledger by triggers
+    """
+    CREATE TABLE IF NOT EXISTS account_balances (
+        customer_id TEXT NOT NULL,
+        account_type TEXT NOT NULL,
+        balance REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (customer_id, account_type)
+    ) WITHOUT ROWID;
+    INSERT OR REPLACE INTO account_balances (customer_id, account_type, balance, txn_count)
+    SELECT customer_id, account_type, SUM(amount), COUNT(*)
+    FROM transactions
+    GROUP BY customer_id, account_type;
+    """ + BALANCE_TRIGGERS,
+]
+
+def schema_version(conn) -> int:
+    """Return the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn) -> int:
+    """Apply pending migrations in place and return the resulting schema version."""
+    current = schema_version(conn)
+    for version in range(current + 1, len(MIGRATIONS) + 1):
+        conn.executescript(
+            f"BEGIN;\n{MIGRATIONS[version - 1]}\nPRAGMA user_version = {version};\nCOMMIT;"
         )
-    """)
-    
-   
-    cursor.execute("""
-        CREATE TABLE transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id TEXT NOT NULL,
-            account_type TEXT NOT NULL,
-            date TEXT NOT NULL,
-            description TEXT NOT NULL,
-            amount REAL NOT NULL,
-            currency TEXT DEFAULT 'USD',
-            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+        print(f" Applied migration {version}")
+    return schema_version(conn)
+
+def verify_balances(conn, tolerance: float = 0.005) -> list:
+    """Recompute balances from the ledger and return accounts whose stored totals drifted.
+
+    Each entry is (customer_id, account_type, ledger_balance, stored_balance,
+    ledger_count, stored_count); a missing side is reported as None.
+    """
+    ledger = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in conn.execute("""
+            SELECT customer_id, account_type, SUM(amount), COUNT(*)
+            FROM transactions
+            GROUP BY customer_id, account_type
+        """)
+    }
+    stored = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in conn.execute(
+            "SELECT customer_id, account_type, balance, txn_count FROM account_balances"
         )
+    }
+
+    drift = []
+    for key in sorted(ledger.keys() | stored.keys()):
+        ledger_balance, ledger_count = ledger.get(key, (None, None))
+        stored_balance, stored_count = stored.get(key, (None, None))
+        if ledger_count is None and stored_count == 0:
+            continue  # every transaction of the account was deleted
+        if (
+            ledger_count != stored_count
+            or stored_balance is None
+            or ledger_balance is None
+            or abs(ledger_balance - stored_balance) > tolerance
+        ):
+            drift.append((*key, ledger_balance, stored_balance, ledger_count, stored_count))
+    return drift
+
+def rebuild_balances(conn):
+    """Recompute every account_balances row from the transactions ledger."""
+    conn.executescript("""
+        BEGIN;
+        DELETE FROM account_balances;
+        INSERT INTO account_balances (customer_id, account_type, balance, txn_count)
+        SELECT customer_id, account_type, SUM(amount), COUNT(*)
+        FROM transactions
+        GROUP BY customer_id, account_type;
+        COMMIT;
     """)
-    
-   
+
+def seed_sample_data(conn) -> int:
+    """Insert the demo customer and transactions; return the number of transactions."""
+    cursor = conn.cursor()
+
     cursor.execute("""
         INSERT INTO customers (customer_id, name, email)
         VALUES ('user123', 'John Doe', 'john@example.com')
     """)
-    
-   
+
+
     checking_transactions = [
         ('user123', 'checking', '2026-01-09', 'Grocery Store', -42.30),
         ('user123', 'checking', '2026-01-09', 'Salary', 2500.00),
@@ -52,32 +163,188 @@ def create_database():
         ('user123', 'checking', '2026-01-07', 'Internet Bill', -55.00),
         ('user123', 'checking', '2026-01-06', 'Restaurant', -45.20),
     ]
-    
-    for trans in checking_transactions:
-        cursor.execute("""
-            INSERT INTO transactions (customer_id, account_type, date, description, amount)
-            VALUES (?, ?, ?, ?, ?)
-        """, trans)
-   
+
+    cursor.executemany("""
+        INSERT INTO transactions (customer_id, account_type, date, description, amount)
+        VALUES (?, ?, ?, ?, ?)
+    """, checking_transactions)
+
     savings_transactions = [
         ('user123', 'savings', '2026-01-06', 'Interest', 4.12),
         ('user123', 'savings', '2026-01-03', 'Transfer from Checking', 200.00),
         ('user123', 'savings', '2025-12-28', 'Deposit', 500.00),
     ]
-    
-    for trans in savings_transactions:
-        cursor.execute("""
+
+    cursor.executemany("""
+        INSERT INTO transactions (customer_id, account_type, date, description, amount)
+        VALUES (?, ?, ?, ?, ?)
+    """, savings_transactions)
+
+    conn.commit()
+    return len(checking_transactions) + len(savings_transactions)
+
+def create_database(db_path: str = DB_PATH, reset: bool = False):
+    """Create or upgrade the SQLite database and seed demo data into an empty one."""
+
+    if reset and os.path.exists(db_path):
+        os.remove(db_path)
+
+
+    conn = sqlite3.connect(db_path)
+
+    version = migrate(conn)
+
+    seeded = 0
+    if conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0] == 0:
+        seeded = seed_sample_data(conn)
+
+    conn.close()
+
+    print(f" Database ready: {db_path} (schema version {version})")
+    if seeded:
+        print(f" Sample customer: user123")
+        print(f" Transactions added: {seeded}")
+
+# (description, min amount, max amount) templates for generated transactions
+SYNTHETIC_TRANSACTIONS = {
+    "checking": [
+        ("Grocery Store", -180.00, -8.00),
+        ("Coffee Shop", -9.00, -2.50),
+        ("Restaurant", -120.00, -12.00),
+        ("Gas Station", -90.00, -20.00),
+        ("Online Shopping", -250.00, -5.00),
+        ("Internet Bill", -80.00, -40.00),
+        ("Electric Bill", -200.00, -35.00),
+        ("ATM Withdrawal", -300.00, -20.00),
+        ("Salary", 1800.00, 5200.00),
+        ("Refund", 5.00, 150.00),
+    ],
+    "savings": [
+        ("Interest", 0.50, 25.00),
+        ("Deposit", 50.00, 1500.00),
+        ("Transfer from Checking", 25.00, 800.00),
+        ("Withdrawal", -600.00, -20.00),
+    ],
+}
+
+def synthetic_transactions(customers: int, transactions_per_account: int, days: int,
+                           seed: int, end_date: date):
+    """Yield (customer_id, account_type, date, description, amount) rows."""
+    rng = random.Random(seed)
+    dates = [(end_date - timedelta(days=offset)).isoformat() for offset in range(days)]
+    for number in range(1, customers + 1):
+        customer_id = f"user{number}"
+        for account_type, templates in SYNTHETIC_TRANSACTIONS.items():
+            for _ in range(transactions_per_account):
+                description, low, high = rng.choice(templates)
+                yield (customer_id, account_type, rng.choice(dates), description,
+                       round(rng.uniform(low, high), 2))
+
+def generate_database(db_path: str = DB_PATH, customers: int = 1000,
+                      transactions_per_account: int = 100, days: int = 365, seed: int = 42,
+                      batch_size: int = 100_000, end_date: date = date(2026, 1, 9)):
+    """Replace the database with a synthetic ledger for scale testing.
+
+    Rows are streamed through executemany in large transactions with the
+    transactions index and balance triggers dropped; both are rebuilt once
+    the load finishes.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    migrate(conn)
+
+    # Bulk-load settings: this is a throwaway file until the load completes
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.executescript("""
+        DROP INDEX IF EXISTS idx_transactions_account_date;
+        DROP TRIGGER IF EXISTS trg_transactions_insert_balance;
+        DROP TRIGGER IF EXISTS trg_transactions_delete_balance;
+        DROP TRIGGER IF EXISTS trg_transactions_update_balance;
+    """)
+
+    total_rows = customers * len(SYNTHETIC_TRANSACTIONS) * transactions_per_account
+    print(f" Generating {customers:,} customers, {total_rows:,} transactions into {db_path}")
+
+    start = time.perf_counter()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO customers (customer_id, name, email) VALUES (?, ?, ?)",
+        ((f"user{n}", f"Customer {n}", f"user{n}@example.com") for n in range(1, customers + 1))
+    )
+    conn.execute("COMMIT")
+
+    rows = synthetic_transactions(customers, transactions_per_account, days, seed, end_date)
+    loaded = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        conn.execute("BEGIN")
+        conn.executemany("""
             INSERT INTO transactions (customer_id, account_type, date, description, amount)
             VALUES (?, ?, ?, ?, ?)
-        """, trans)
-    
-    #
-    conn.commit()
+        """, batch)
+        conn.execute("COMMIT")
+        loaded += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"\r Loaded {loaded:,}/{total_rows:,} rows ({loaded / elapsed:,.0f} rows/sec)", end="", flush=True)
+    load_seconds = time.perf_counter() - start
+    print()
+
+    index_start = time.perf_counter()
+    conn.executescript(MIGRATIONS[1])
+    rebuild_balances(conn)
+    conn.executescript(BALANCE_TRIGGERS)
+    conn.execute("ANALYZE")
+    index_seconds = time.perf_counter() - index_start
+
+    conn.execute("PRAGMA journal_mode=WAL")
     conn.close()
-    
-    print(f" Database created: {db_path}")
-    print(f" Sample customer: user123")
-    print(f" Transactions added: {len(checking_transactions) + len(savings_transactions)}")
+
+    print(f" Load: {loaded:,} rows in {load_seconds:.1f}s ({loaded / max(load_seconds, 1e-9):,.0f} rows/sec)")
+    print(f" Index + balances: {index_seconds:.1f}s")
+    print(f" Total: {load_seconds + index_seconds:.1f}s")
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create or upgrade the banking database")
+    parser.add_argument("--db", default=DB_PATH, help="Database file path")
+    parser.add_argument("--reset", action="store_true", help="Delete the database and start over")
+    parser.add_argument("--verify-balances", action="store_true",
+                        help="Compare account_balances with the ledger and report drift")
+    parser.add_argument("--rebuild-balances", action="store_true",
+                        help="Recompute account_balances from the ledger")
+    parser.add_argument("--generate", action="store_true",
+                        help="Replace the database with a synthetic ledger for scale testing")
+    parser.add_argument("--customers", type=int, default=1000, help="Generated customers")
+    parser.add_argument("--transactions-per-account", type=int, default=100,
+                        help="Generated transactions per checking/savings account")
+    parser.add_argument("--days", type=int, default=365, help="Date span of generated transactions")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for generated data")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="Rows per insert transaction")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_database(args.db, args.customers, args.transactions_per_account,
+                          args.days, args.seed, args.batch_size)
+    else:
+        create_database(args.db, reset=args.reset)
+
+    if args.rebuild_balances or args.verify_balances:
+        conn = sqlite3.connect(args.db)
+        if args.rebuild_balances:
+            rebuild_balances(conn)
+            print(" Rebuilt account_balances from the ledger")
+        drift = verify_balances(conn)
+        conn.close()
+        for customer_id, account_type, ledger_balance, stored_balance, ledger_count, stored_count in drift:
+            print(f" Drift {customer_id}/{account_type}: ledger {ledger_balance} ({ledger_count} txns), "
+                  f"stored {stored_balance} ({stored_count} txns)")
+        print(f" Balances verified: {len(drift)} account(s) drifted")
+        if drift:
+            raise SystemExit(1)
@@ -0,0 +1,120 @@
+import os
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# "torch" runs the model through sentence-transformers / PyTorch, "onnx" and
+# "onnx-int8" run the model's ONNX exports on ONNX Runtime without torch
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+
+# ONNX files published in the model repo; EMBED_ONNX_FILE overrides the pick
+# (e.g. onnx/model_qint8_arm64.onnx on ARM, onnx/model_qint8_avx512_vnni.onnx on newer Xeons)
+ONNX_MODEL_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+EMBED_BACKENDS = ["torch", *ONNX_MODEL_FILES]
+
+# all-MiniLM-L6-v2 truncates input at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+
+def model_file(model_name: str, filename: str) -> str:
+    """Return a local path to a model file, from a local model folder or the Hugging Face cache."""
+    if os.path.isdir(model_name):
+        return os.path.join(model_name, filename)
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id=model_name, filename=filename)
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    Sentence embeddings from an ONNX export of a sentence-transformers model.
+
+    Reproduces the sentence-transformers pipeline (word piece tokenization,
+    mean pooling over the attention mask, L2 normalization) with ONNX Runtime
+    and the tokenizers library, so vectors can be compared with ones stored
+    by the PyTorch backend.
+    """
+
+    onnx_file: str = "onnx/model.onnx"
+    threads: int = 0
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: set = PrivateAttr()
+
+    def __init__(self, model_name: str = EMBED_MODEL_NAME, onnx_file: str = "onnx/model.onnx",
+                 threads: int = 0, embed_batch_size: int = 64, **kwargs):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        super().__init__(model_name=model_name, onnx_file=onnx_file, threads=threads,
+                         embed_batch_size=embed_batch_size, **kwargs)
+
+        tokenizer = Tokenizer.from_file(model_file(model_name, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        tokenizer.enable_padding(pad_id=tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+        self._tokenizer = tokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(
+            model_file(model_name, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self._session.run(
+            None, {name: value for name, value in inputs.items() if name in self._input_names}
+        )[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._encode([query])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+def create_embed_model(backend: str = EMBED_BACKEND, model_name: str = EMBED_MODEL_NAME, threads: int = 0):
+    """Load the product knowledge embedding model on the given backend."""
+    backend = backend.lower()
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        return HuggingFaceEmbedding(model_name=model_name)
+    if backend in ONNX_MODEL_FILES:
+        onnx_file = os.getenv("EMBED_ONNX_FILE") or ONNX_MODEL_FILES[backend]
+        return OnnxEmbedding(model_name=model_name, onnx_file=onnx_file, threads=threads)
+    raise ValueError(f"Unknown EMBED_BACKEND {backend!r}; expected one of {', '.join(EMBED_BACKENDS)}")
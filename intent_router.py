@@ -0,0 +1,194 @@
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import NamedTuple, Optional
+
+ACCOUNT_WORDS = {
+    "checking": "checking", "chequing": "checking",
+    "savings": "savings", "saving": "savings",
+}
+BALANCE_WORDS = {"balance", "balances"}
+# Only part of a balance question in "how much (money) do I have / is in checking"
+AMOUNT_WORDS = {"money", "funds"}
+TRANSACTION_WORDS = {"transaction", "transactions", "purchase", "purchases", "payment", "payments",
+                     "charge", "charges", "activity"}
+LATEST_WORDS = {"last", "latest", "recent", "newest"}
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10}
+
+# Words that may appear around an intent without changing it. A query with any
+# word outside this vocabulary and the intent words above (a date, a merchant,
+# "spend", "why", "and", a product name...) is left to the agent.
+FILLER_WORDS = {
+    "a", "about", "account", "accounts", "acct", "am", "an", "any", "are", "can", "check",
+    "could", "current", "currently", "display", "do", "get", "give", "have", "hello", "hey", "hi",
+    "how", "i", "in", "is", "it", "list", "look", "me", "most", "much", "my", "need", "now",
+    "of", "on", "please", "pls", "right", "see", "show", "tell", "thanks", "the", "there", "to",
+    "up", "want", "was", "what", "whats", "what's", "which", "would", "you",
+}
+
+CUSTOMER_ID_PATTERN = re.compile(r"^user\d+$")
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+RECENT_LIMIT = 5
+
+
+class RoutedIntent(NamedTuple):
+    """A transaction tool call that answers a query without the model."""
+    tool: str
+    args: dict
+
+
+def route(query: str, customer_id: str) -> Optional[RoutedIntent]:
+    """
+    Map a simple balance or transaction question to one tool call, or None.
+
+    The grammar only accepts queries made entirely of intent words and filler
+    with exactly one reading; anything else (several intents, another
+    customer's ID, dates, unknown words) returns None so the agent handles it.
+    """
+    words = WORD_PATTERN.findall(query.lower().replace("’", "'"))
+    if not words:
+        return None
+
+    accounts = set()
+    balance = transactions = latest = plural = False
+    limit = None
+    for word in words:
+        if word in ACCOUNT_WORDS:
+            accounts.add(ACCOUNT_WORDS[word])
+        elif word in BALANCE_WORDS:
+            balance = True
+        elif word in AMOUNT_WORDS:
+            pass
+        elif word in TRANSACTION_WORDS:
+            transactions = True
+            plural = plural or word.endswith("s") or word == "activity"
+        elif word in LATEST_WORDS:
+            latest = True
+        elif word.isdigit() or word in NUMBER_WORDS:
+            if limit is not None:
+                return None
+            limit = int(word) if word.isdigit() else NUMBER_WORDS[word]
+        elif CUSTOMER_ID_PATTERN.match(word):
+            if word != customer_id.lower():
+                return None  # the agent refuses requests about other customers
+        elif word not in FILLER_WORDS:
+            return None
+
+    # A bare "how much?" is usually a follow-up about a fee or product; it only asks
+    # for a balance together with an account or "have"
+    how_much = "how" in words and "much" in words
+    balance = balance or (how_much and bool(accounts or "have" in words))
+    if balance == transactions:
+        return None
+    if balance:
+        if limit is not None:
+            return None
+        if len(accounts) == 1:
+            return RoutedIntent("calculate_account_balance",
+                                {"customer_id": customer_id, "account_type": accounts.pop()})
+        return RoutedIntent("get_account_summary", {"customer_id": customer_id})
+
+    if len(accounts) != 1 or not (latest or plural):
+        return None
+    account_type = accounts.pop()
+    if limit is None and not plural:
+        return RoutedIntent("get_last_transaction", {"customer_id": customer_id, "account_type": account_type})
+    if limit is not None and not 1 <= limit <= 10:
+        return None
+    return RoutedIntent("get_recent_transactions", {
+        "customer_id": customer_id,
+        "account_type": account_type,
+        "limit": limit or RECENT_LIMIT,
+    })
+
+
+def format_amount(amount: float, currency: str = "USD") -> str:
+    sign = "-" if amount < 0 else ""
+    if currency == "USD":
+        return f"{sign}${abs(amount):,.2f}"
+    return f"{sign}{abs(amount):,.2f} {currency}"
+
+
+def format_transaction(transaction: dict) -> str:
+    return (f"{transaction['date']}: {transaction['description']}, "
+            f"{format_amount(transaction['amount'], transaction['currency'])}")
+
+
+def render(intent: RoutedIntent, result: dict) -> str:
+    """Turn a tool result into the customer-facing answer."""
+    if result.get("status") != "ok":
+        return f"Sorry, I couldn't find that: {result.get('message', 'no data available')}."
+
+    if intent.tool == "calculate_account_balance":
+        return (f"Your {result['account_type']} account balance is "
+                f"{format_amount(result['balance'], result['currency'])}.")
+
+    if intent.tool == "get_last_transaction":
+        return (f"Your last {result['account_type']} transaction was {result['description']} "
+                f"for {format_amount(result['amount'], result['currency'])} on {result['date']}.")
+
+    if intent.tool == "get_recent_transactions":
+        lines = [f"Your last {result['count']} {result['account_type']} transactions:"]
+        lines += [f"- {format_transaction(transaction)}" for transaction in result["transactions"]]
+        return "\n".join(lines)
+
+    if intent.tool == "get_account_summary":
+        lines = ["Here is an overview of your accounts:"]
+        for account in result["accounts"]:
+            line = f"- {account['account_type'].capitalize()}: {format_amount(account['balance'], result['currency'])}"
+            if account["last_transaction"]["date"]:
+                line += f" (last transaction: {format_transaction(account['last_transaction'])})"
+            lines.append(line)
+        return "\n".join(lines)
+
+    raise ValueError(f"No answer template for {intent.tool}")
+
+
+def turn_events(author: str, user_text: str, intent: RoutedIntent, result: dict, answer: str) -> list:
+    """
+    Session events for a routed turn, shaped like an agent turn that made the
+    same tool call, so later turns sent to the model see the full history.
+    """
+    from google.adk.events import Event
+    from google.genai import types
+
+    invocation_id = f"e-{uuid.uuid4()}"
+    call_id = f"route-{uuid.uuid4().hex[:12]}"
+    return [
+        Event(invocation_id=invocation_id, author="user",
+              content=types.Content(role="user", parts=[types.Part(text=user_text)])),
+        Event(invocation_id=invocation_id, author=author, content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(id=call_id, name=intent.tool, args=intent.args))])),
+        Event(invocation_id=invocation_id, author=author, content=types.Content(role="user", parts=[
+            types.Part(function_response=types.FunctionResponse(id=call_id, name=intent.tool, response=result))])),
+        Event(invocation_id=invocation_id, author=author,
+              content=types.Content(role="model", parts=[types.Part(text=answer)])),
+    ]
+
+
+class IntentRouterStats:
+    """Thread-safe counts of queries answered by the fast path, per tool, and sent to the agent."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, tool: Optional[str]):
+        with self._lock:
+            self._counts[tool or "agent"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        agent = counts.pop("agent", 0)
+        return {
+            "queries": total,
+            "routed": total - agent,
+            "agent": agent,
+            "hit_rate": round((total - agent) / total, 4) if total else 0.0,
+            "tools": counts,
+        }
@@ -0,0 +1,188 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import NamedTuple
+
+from vector_index import ScoredChunk
+
+# File setup_rag.py writes next to each Chroma collection
+LEXICAL_SUFFIX = ".bm25.json"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Question filler that carries no product meaning
+STOPWORDS = {
+    "a", "about", "an", "and", "any", "are", "as", "at", "be", "can", "could", "do", "does", "for",
+    "from", "get", "give", "has", "have", "how", "i", "if", "in", "is", "it", "know", "like", "me",
+    "much", "my", "need", "of", "offer", "on", "or", "please", "tell", "than", "that", "the",
+    "there", "this", "to", "us", "want", "was", "we", "what", "whats", "when", "which", "who",
+    "why", "will", "with", "would", "you", "your",
+}
+
+
+def stem(word: str) -> str:
+    """Fold simple English plurals (cards -> card, policies -> policy)."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens with stopwords removed and plurals folded."""
+    tokens = []
+    for word in TOKEN_RE.findall(text.lower()):
+        if word not in STOPWORDS:
+            term = stem(word)
+            if term not in STOPWORDS:
+                tokens.append(term)
+    return tokens
+
+
+def lexical_file(db_path: str, collection_name: str) -> str:
+    """Return the BM25 index path for a catalog collection."""
+    return os.path.join(db_path, collection_name + LEXICAL_SUFFIX)
+
+
+class LexicalMatch(NamedTuple):
+    """
+    A BM25 hit. score is the BM25 score divided by the best score the query
+    could reach, so it lies in [0, 1); coverage is the share of query terms
+    found in the chunk.
+    """
+    text: str
+    score: float
+    node_id: str
+    coverage: float
+
+
+class BM25Index:
+    """In-memory inverted index over the product chunks, scored with Okapi BM25."""
+
+    def __init__(self, ids: list, texts: list, postings: dict, doc_lengths: list,
+                 k1: float = 1.2, b: float = 0.75):
+        self.ids = ids
+        self.texts = texts
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, ids: list, texts: list, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Tokenize the chunks and build the term -> [(chunk, term frequency)] postings."""
+        postings = {}
+        doc_lengths = []
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc, tf))
+        return cls(ids, texts, postings, doc_lengths, k1, b)
+
+    def save(self, path: str):
+        """Write the index atomically."""
+        with open(path + ".tmp", "w") as f:
+            json.dump({
+                "ids": self.ids,
+                "texts": self.texts,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+                "k1": self.k1,
+                "b": self.b,
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path) as f:
+            data = json.load(f)
+        postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        return cls(data["ids"], data["texts"], postings, data["doc_lengths"], data["k1"], data["b"])
+
+    def __len__(self):
+        return len(self.texts)
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.texts) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 3) -> list:
+        """Return the top_k matching chunks for a query, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.texts:
+            return []
+
+        scores = {}
+        matched = Counter()
+        for term in terms:
+            idf = self.idf(term)
+            for doc, tf in self.postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc] / self.avg_length
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+                matched[doc] += 1
+
+        # Unknown terms count too, so a query about something we do not sell never looks confident
+        best_possible = sum(self.idf(term) for term in terms) * (self.k1 + 1)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        return [
+            LexicalMatch(self.texts[doc], scores[doc] / best_possible, self.ids[doc], matched[doc] / len(terms))
+            for doc in ranked
+        ]
+
+
+def is_decisive(matches: list, min_coverage: float = 1.0, margin: float = 1.5) -> bool:
+    """True when the top chunk holds the query's terms and clearly outscores the runner-up."""
+    if not matches or matches[0].coverage < min_coverage:
+        return False
+    return len(matches) == 1 or matches[0].score >= margin * matches[1].score
+
+
+def fuse_scores(vector_nodes: list, matches: list, weight: float = 0.3) -> list:
+    """
+    Blend vector and lexical scores into one ranking.
+
+    Each chunk scores max(vector, (1 - weight) * vector + weight * lexical):
+    a lexical match can lift a chunk but never pull a good vector match
+    below the relevance cutoff. Lexical-only chunks score weight * lexical.
+    """
+    lexical = {match.node_id: match for match in matches}
+    fused = []
+    for node in vector_nodes:
+        match = lexical.pop(node.node_id, None)
+        score = node.score if match is None else max(node.score, (1 - weight) * node.score + weight * match.score)
+        fused.append(ScoredChunk(node.text, score, node.node_id, node.metadata))
+    for match in lexical.values():
+        fused.append(ScoredChunk(match.text, weight * match.score, match.node_id, {}))
+    fused.sort(key=lambda chunk: chunk.score, reverse=True)
+    return fused[:max(len(vector_nodes), 1)]
+
+
+class LexicalStats:
+    """Thread-safe counts of how product queries were answered."""
+
+    ROUTES = ("lexical", "fused", "vector")
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, route: str):
+        with self._lock:
+            self._counts[route] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {route: self._counts[route] for route in self.ROUTES}
+        total = sum(counts.values())
+        return {
+            "queries": total,
+            **counts,
+            "lexical_hit_rate": round(counts["lexical"] / total, 4) if total else 0.0,
+            "fused_rate": round(counts["fused"] / total, 4) if total else 0.0,
+        }
@@ -1,17 +1,183 @@
 import sqlite3
+import asyncio
+from datetime import date as Date
+import sys
+import functools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from mcp.server.fastmcp import FastMCP
 import os
 # Create MCP server
 mcp = FastMCP("banking_mcp_server")
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_data.db")
+DB_PATH = os.getenv(
+    "BANK_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_data.db")
+)
 
-def get_db_connection():
-    """Create database connection."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Access columns by name
-    return conn
+# Long-lived connections shared by all tool calls (0 = open a connection per call)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Threads that run tool bodies, so concurrent calls don't queue behind each other
+TOOL_WORKERS = int(os.getenv("MCP_TOOL_WORKERS", "8"))
 
-@mcp.tool()
+class ConnectionPool:
+    """Fixed-size pool of tuned, long-lived SQLite connections."""
+    
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+        conn.execute("PRAGMA cache_size=-65536")    # 64 MiB
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        return self._idle.get()
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the block."""
+        if self.size <= 0:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row  # Access columns by name
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+    
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+# Tool queries. Each one must be an index search (idx_transactions_account_date
+# or the account_balances primary key, see database.py); check_query_plans()
+# verifies none falls back to a scan.
+LAST_TRANSACTION_SQL = """
+    SELECT date, description, amount, currency
+    FROM transactions
+    WHERE customer_id = ? AND account_type = ?
+    ORDER BY date DESC, id DESC
+    LIMIT 1
+"""
+
+RECENT_TRANSACTIONS_SQL = """
+    SELECT date, description, amount, currency
+    FROM transactions
+    WHERE customer_id = ? AND account_type = ?
+    ORDER BY date DESC, id DESC
+    LIMIT ?
+"""
+
+ACCOUNT_BALANCE_SQL = """
+    SELECT balance
+    FROM account_balances
+    WHERE customer_id = ? AND account_type = ?
+"""
+
+TRANSACTIONS_BY_DATE_SQL = """
+    SELECT date, description, amount, currency
+    FROM transactions
+    WHERE customer_id = ? AND account_type = ? AND date = ?
+    ORDER BY id DESC
+"""
+
+# One page of a date range, newest first. Keyset pagination: the page starts
+# strictly after the (date, id) of the previous page's last row.
+TRANSACTIONS_IN_RANGE_SQL = """
+    SELECT id, date, description, amount, currency
+    FROM transactions
+    WHERE customer_id = ? AND account_type = ?
+      AND date >= ? AND date <= ?
+      AND (date, id) < (?, ?)
+    ORDER BY date DESC, id DESC
+    LIMIT ?
+"""
+
+# Balance, count and latest transaction of every account in one statement
+ACCOUNT_SUMMARY_SQL = """
+    SELECT b.account_type, b.balance, b.txn_count,
+           t.date, t.description, t.amount, t.currency
+    FROM account_balances b
+    LEFT JOIN transactions t ON t.id = (
+        SELECT id
+        FROM transactions
+        WHERE customer_id = b.customer_id AND account_type = b.account_type
+        ORDER BY date DESC, id DESC
+        LIMIT 1
+    )
+    WHERE b.customer_id = ? AND b.txn_count > 0
+    ORDER BY b.account_type
+"""
+
+db_pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="mcp-tool")
+
+def run_in_tool_pool(fn):
+    """Wrap a blocking tool function so it runs on the tool thread pool."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(tool_executor, functools.partial(fn, *args, **kwargs))
+    return wrapper
+
+def banking_tool(fn):
+    """Register fn as an MCP tool executed on the tool thread pool."""
+    mcp.add_tool(run_in_tool_pool(fn))
+    return fn
+
+def check_query_plans(db_path: str = DB_PATH) -> list:
+    """Return (query name, plan) pairs for tool queries that scan or sort."""
+    queries = {
+        "LAST_TRANSACTION_SQL": LAST_TRANSACTION_SQL,
+        "RECENT_TRANSACTIONS_SQL": RECENT_TRANSACTIONS_SQL,
+        "ACCOUNT_BALANCE_SQL": ACCOUNT_BALANCE_SQL,
+        "TRANSACTIONS_BY_DATE_SQL": TRANSACTIONS_BY_DATE_SQL,
+        "ACCOUNT_SUMMARY_SQL": ACCOUNT_SUMMARY_SQL,
+        "TRANSACTIONS_IN_RANGE_SQL": TRANSACTIONS_IN_RANGE_SQL,
+    }
+    failures = []
+    with ConnectionPool(db_path, 0).connection() as conn:
+        for name, sql in queries.items():
+            params = [None] * sql.count("?")
+            plan = " | ".join(row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+            if "SEARCH" not in plan or "SCAN" in plan or "TEMP B-TREE" in plan:
+                failures.append((name, plan))
+    return failures
+
+@banking_tool
 def get_last_transaction(customer_id: str, account_type: str) -> dict:
     """
     Get the most recent transaction for a customer's account.
@@ -23,19 +189,9 @@ def get_last_transaction(customer_id: str, account_type: str) -> dict:
     Returns:
         dict: The most recent transaction details
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT date, description, amount, currency
-        FROM transactions
-        WHERE customer_id = ? AND account_type = ?
-        ORDER BY date DESC, id DESC
-        LIMIT 1
-    """, (customer_id, account_type))
-    
-    row = cursor.fetchone()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.execute(LAST_TRANSACTION_SQL, (customer_id, account_type))
+        row = cursor.fetchone()
     
     if row:
         return {
@@ -53,7 +209,7 @@ def get_last_transaction(customer_id: str, account_type: str) -> dict:
             "message": f"No transactions found for {customer_id} - {account_type}"
         }
 
-@mcp.tool()
+@banking_tool
 def get_recent_transactions(customer_id: str, account_type: str, limit: int = 5) -> dict:
     """
     Get recent transactions for a customer's account.
@@ -72,19 +228,9 @@ def get_recent_transactions(customer_id: str, account_type: str, limit: int = 5)
     if limit > 10:
         limit = 10
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT date, description, amount, currency
-        FROM transactions
-        WHERE customer_id = ? AND account_type = ?
-        ORDER BY date DESC, id DESC
-        LIMIT ?
-    """, (customer_id, account_type, limit))
-    
-    rows = cursor.fetchall()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.execute(RECENT_TRANSACTIONS_SQL, (customer_id, account_type, limit))
+        rows = cursor.fetchall()
     
     if rows:
         transactions = []
@@ -109,10 +255,10 @@ def get_recent_transactions(customer_id: str, account_type: str, limit: int = 5)
             "message": f"No transactions found for {customer_id} - {account_type}"
         }
 
-@mcp.tool()
+@banking_tool
 def calculate_account_balance(customer_id: str, account_type: str) -> dict:
     """
-    Calculate current account balance from all transactions.
+    Get the current account balance.
     
     Args:
         customer_id: The customer's ID (e.g., 'user123')
@@ -121,29 +267,21 @@ def calculate_account_balance(customer_id: str, account_type: str) -> dict:
     Returns:
         dict: Current balance details
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT SUM(amount) as total
-        FROM transactions
-        WHERE customer_id = ? AND account_type = ?
-    """, (customer_id, account_type))
+    with db_pool.connection() as conn:
+        cursor = conn.execute(ACCOUNT_BALANCE_SQL, (customer_id, account_type))
+        row = cursor.fetchone()
     
-    row = cursor.fetchone()
-    conn.close()
-    
-    # Get the total (will be None if no transactions)
-    balance = row["total"] if row["total"] is not None else 0.0
+    # Running total maintained by database triggers (0.0 if no transactions)
+    balance = row["balance"] if row is not None else 0.0
     
     return {
         "status": "ok",
         "customer_id": customer_id,
         "account_type": account_type,
-        "balance": float(balance),
+        "balance": round(float(balance), 2),
         "currency": "USD"
     }
-@mcp.tool()
+@banking_tool
 def get_transactions_by_date(customer_id: str, account_type: str, date: str) -> dict:
     """
     Get transactions for a specific date.
@@ -156,18 +294,9 @@ def get_transactions_by_date(customer_id: str, account_type: str, date: str) ->
     Returns:
         dict: Transactions for that date
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT date, description, amount, currency
-        FROM transactions
-        WHERE customer_id = ? AND account_type = ? AND date = ?
-        ORDER BY id DESC
-    """, (customer_id, account_type, date))
-    
-    rows = cursor.fetchall()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.execute(TRANSACTIONS_BY_DATE_SQL, (customer_id, account_type, date))
+        rows = cursor.fetchall()
     
     if rows:
         transactions = []
@@ -193,6 +322,163 @@ def get_transactions_by_date(customer_id: str, account_type: str, date: str) ->
             "message": f"No transactions found for {customer_id} on {date} in {account_type} account"
         }
 
+@banking_tool
+def get_account_summary(customer_id: str) -> dict:
+    """
+    Get an overview of all of a customer's accounts in one call.
+    
+    Prefer this over separate balance and last-transaction calls when the
+    customer asks about more than one account or for a general overview.
+    
+    Args:
+        customer_id: The customer's ID (e.g., 'user123')
+    
+    Returns:
+        dict: Balance, transaction count and last transaction per account
+    """
+    with db_pool.connection() as conn:
+        cursor = conn.execute(ACCOUNT_SUMMARY_SQL, (customer_id,))
+        rows = cursor.fetchall()
+    
+    if rows:
+        accounts = []
+        for row in rows:
+            accounts.append({
+                "account_type": row["account_type"],
+                "balance": round(float(row["balance"]), 2),
+                "transaction_count": row["txn_count"],
+                "last_transaction": {
+                    "date": row["date"],
+                    "description": row["description"],
+                    "amount": row["amount"],
+                    "currency": row["currency"]
+                }
+            })
+        
+        return {
+            "status": "ok",
+            "customer_id": customer_id,
+            "currency": "USD",
+            "accounts": accounts
+        }
+    else:
+        return {
+            "status": "error",
+            "message": f"No accounts found for {customer_id}"
+        }
+
+@banking_tool
+def get_transactions_in_range(
+    customer_id: str,
+    account_type: str,
+    start: str,
+    end: str,
+    cursor: str = "",
+    page_size: int = 50
+) -> dict:
+    """
+    Get all transactions between two dates (inclusive), newest first, one page at a time.
+    
+    Use this for questions about a period (e.g. 'all my spending in December')
+    instead of calling get_transactions_by_date once per day. If next_cursor
+    is not null, call again with cursor=next_cursor to get the next page.
+    
+    Args:
+        customer_id: The customer's ID (e.g., 'user123')
+        account_type: Account type ('checking' or 'savings')
+        start: First date in format 'YYYY-MM-DD' (e.g., '2025-12-01')
+        end: Last date in format 'YYYY-MM-DD' (e.g., '2025-12-31')
+        cursor: next_cursor from the previous page ('' for the first page)
+        page_size: Transactions per page (1-200)
+    
+    Returns:
+        dict: Columnar page of transactions ('columns' names the fields of each row)
+    """
+    try:
+        # Compare and query in the column's 'YYYY-MM-DD' form ("20250101" parses too)
+        start, end = Date.fromisoformat(start).isoformat(), Date.fromisoformat(end).isoformat()
+        if start > end:
+            raise ValueError
+    except ValueError:
+        return {
+            "status": "error",
+            "message": f"Invalid date range {start} to {end}; use 'YYYY-MM-DD' with start <= end"
+        }
+    
+    # Validate page size
+    if page_size < 1:
+        page_size = 1
+    if page_size > 200:
+        page_size = 200
+    
+    if cursor:
+        try:
+            after_date, after_id = cursor.rsplit(":", 1)
+            after_date, after_id = Date.fromisoformat(after_date).isoformat(), int(after_id)
+        except ValueError:
+            return {
+                "status": "error",
+                "message": f"Invalid cursor: {cursor}"
+            }
+    else:
+        after_date, after_id = end, 2**63 - 1
+    
+    with db_pool.connection() as conn:
+        rows = conn.execute(TRANSACTIONS_IN_RANGE_SQL, (
+            customer_id, account_type, start, min(end, after_date),
+            after_date, after_id, page_size + 1
+        )).fetchall()
+    
+    if not rows and not cursor:
+        return {
+            "status": "error",
+            "message": f"No transactions found for {customer_id} between {start} and {end} in {account_type} account"
+        }
+    
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = f"{rows[-1]['date']}:{rows[-1]['id']}" if has_more else None
+    
+    # Columnar layout keeps the payload (and model tokens) small
+    currencies = {row["currency"] for row in rows}
+    if len(currencies) <= 1:
+        columns = ["date", "description", "amount"]
+        currency = currencies.pop() if currencies else "USD"
+    else:
+        columns = ["date", "description", "amount", "currency"]
+        currency = None
+    
+    return {
+        "status": "ok",
+        "customer_id": customer_id,
+        "account_type": account_type,
+        "start": start,
+        "end": end,
+        "currency": currency,
+        "columns": columns,
+        "rows": [[row[column] for column in columns] for row in rows],
+        "count": len(rows),
+        "next_cursor": next_cursor
+    }
+
+# Plain-function view of the tools, for registering them in-process as ADK function tools
+BANKING_TOOLS = [
+    get_last_transaction,
+    get_recent_transactions,
+    calculate_account_balance,
+    get_transactions_by_date,
+    get_account_summary,
+    get_transactions_in_range,
+]
+
 if __name__ == "__main__":
+    if "--check-plans" in sys.argv:
+        failures = check_query_plans()
+        for name, plan in failures:
+            print(f"❌ {name}: {plan}")
+        if failures:
+            sys.exit(1)
+        print("✅ All tool queries are index searches")
+        sys.exit(0)
     
     mcp.run()
\ No newline at end of file
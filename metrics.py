@@ -0,0 +1,329 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter as CountMap
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Print one JSON line per request with its stage breakdown
+METRICS_LOG_REQUESTS = os.getenv("METRICS_LOG_REQUESTS", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_format_number(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally labelled."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(f"{self.name}_total", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Current value, either set directly or read from a function at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Report function() (unlabelled) instead of a stored value."""
+        self._function = function
+
+    def samples(self) -> list:
+        if self._function is not None:
+            try:
+                return [(self.name, "", self._function())]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, le), cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    """The metrics exposed on /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "bank_agent_request_seconds", "HTTP request latency until the last response byte.", ("path", "status")))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "bank_agent_stage_seconds", "Time spent in each hot-path stage of a request.", ("stage",)))
+TOOL_SECONDS = REGISTRY.register(Histogram(
+    "bank_agent_tool_seconds", "Tool call latency by tool name.", ("tool",)))
+TOOL_CALLS = REGISTRY.register(Counter(
+    "bank_agent_tool_calls", "Tool calls by tool name.", ("tool",)))
+LLM_TURNS = REGISTRY.register(Counter(
+    "bank_agent_llm_turns", "Model calls made by the agent."))
+TOOL_CALLS_PER_REQUEST = REGISTRY.register(Histogram(
+    "bank_agent_tool_calls_per_request", "Tool calls made while serving one request.", ("path",), COUNT_BUCKETS))
+LLM_TURNS_PER_REQUEST = REGISTRY.register(Histogram(
+    "bank_agent_llm_turns_per_request", "Model calls made while serving one request.", ("path",), COUNT_BUCKETS))
+IN_FLIGHT_REQUESTS = REGISTRY.register(Gauge(
+    "bank_agent_in_flight_requests", "HTTP requests being served."))
+
+
+class RequestMetrics:
+    """Stage times and call counts of one request, shared with the tasks and threads serving it."""
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.status = None
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tools = CountMap()
+        self.llm_turns = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_tool(self, tool: str):
+        with self._lock:
+            self.tools[tool] += 1
+
+    def add_llm_turn(self):
+        with self._lock:
+            self.llm_turns += 1
+
+    def log_record(self, seconds: float) -> dict:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round(seconds * 1000, 2),
+            "stages_ms": {stage: round(value * 1000, 2) for stage, value in self.stages.items()},
+            "tool_calls": dict(self.tools),
+            "llm_turns": self.llm_turns,
+        }
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Record time spent in a stage for the metrics and the current request's log line."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    request = current_request.get()
+    if request is not None:
+        request.add_stage(stage, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a request stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_tool_call(tool: str, seconds: float):
+    """Record one tool call (counted, and timed under its own name and the "tool" stage)."""
+    TOOL_CALLS.inc(tool=tool)
+    TOOL_SECONDS.observe(seconds, tool=tool)
+    record_stage("tool", seconds)
+    request = current_request.get()
+    if request is not None:
+        request.add_tool(tool)
+
+
+def record_llm_turn(seconds: float):
+    """Record one model call."""
+    LLM_TURNS.inc()
+    record_stage("llm", seconds)
+    request = current_request.get()
+    if request is not None:
+        request.add_llm_turn()
+
+
+class AgentCallbackTimer:
+    """
+    ADK agent callbacks that time model and tool calls.
+
+    Pass before_model/after_model/before_tool/after_tool to LlmAgent. Starts
+    are keyed by invocation (model) and function call ID (tool) so parallel
+    tool calls are timed separately; the callbacks never change the result.
+    """
+
+    def __init__(self):
+        self._started = {}
+
+    def before_model(self, callback_context, llm_request):
+        self._started[("model", callback_context.invocation_id)] = time.perf_counter()
+
+    def after_model(self, callback_context, llm_response):
+        if getattr(llm_response, "partial", False):
+            return None
+        start = self._started.pop(("model", callback_context.invocation_id), None)
+        if start is not None:
+            record_llm_turn(time.perf_counter() - start)
+
+    def before_tool(self, tool, args, tool_context):
+        self._started[("tool", tool_context.function_call_id)] = time.perf_counter()
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        start = self._started.pop(("tool", tool_context.function_call_id), None)
+        if start is not None:
+            record_tool_call(tool.name, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that tracks each HTTP request until its last body chunk
+    (so streamed responses are timed in full), sets X-Request-ID, and logs
+    the request's stage breakdown as one JSON line.
+    """
+
+    def __init__(self, app, exclude: tuple = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        request = RequestMetrics(request_id, scope["method"], scope["path"])
+        token = current_request.set(request)
+        IN_FLIGHT_REQUESTS.inc()
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                request.status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            seconds = time.perf_counter() - request.started
+            IN_FLIGHT_REQUESTS.dec()
+            current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(seconds, path=path, status=request.status or 500)
+            TOOL_CALLS_PER_REQUEST.observe(sum(request.tools.values()), path=path)
+            LLM_TURNS_PER_REQUEST.observe(request.llm_turns, path=path)
+            if METRICS_LOG_REQUESTS:
+                print(json.dumps(request.log_record(seconds)), flush=True)
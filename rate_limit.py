@@ -0,0 +1,157 @@
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+
+
+class RateLimited(Exception):
+    """A request was turned away; the API answers 429 with Retry-After."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    """Tokens in a bucket at `now`, given its level at `updated`."""
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBucketStore:
+    """Token buckets in this process, least recently used dropped past max_keys (an idle bucket is full anyway)."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> float:
+        """Take one token; return 0 if granted, else seconds until one is available."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = refill(tokens, updated, now, rate, capacity)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SqliteBucketStore:
+    """Token buckets in a SQLite file (WAL) shared by every worker on the host."""
+
+    def __init__(self, db_path: str = "rate_limits.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = refill(row[0], row[1], now, rate, capacity) if row else capacity
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                self._conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens - 1 if not wait else tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return wait
+
+
+class RateLimiter:
+    """Per-customer token buckets: `per_minute` sustained requests with bursts of up to `burst`."""
+
+    def __init__(self, store, per_minute: float = 30, burst: int = 10):
+        self.store = store
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.rejected = 0
+
+    def check(self, key: str):
+        """Spend a token for key or raise RateLimited. A rate of 0 disables the limit."""
+        if self.rate <= 0:
+            return
+        wait = self.store.take(key, self.rate, self.capacity, time.time())
+        if wait:
+            self.rejected += 1
+            raise RateLimited("Too many requests for this customer", wait)
+
+
+class AdmissionController:
+    """
+    Global cap on agent runs in progress, with a bounded wait queue.
+
+    Up to max_in_flight runs proceed; up to max_queue more wait at most
+    queue_timeout seconds for a slot. Anything beyond that is rejected at
+    once, so load spikes fail fast instead of stretching tail latency.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 32, queue_timeout: float = 10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = Counter()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def acquire(self):
+        """Take a run slot, waiting in the queue if needed; raise RateLimited if the queue is full or times out."""
+        if self._semaphore.locked() or self.queued:
+            if self.queued >= self.max_queue:
+                self.rejected["queue_full"] += 1
+                raise RateLimited("Server is busy, please retry", self.queue_timeout)
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected["queue_timeout"] += 1
+                raise RateLimited("Server is busy, please retry", self.queue_timeout)
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "rejected_queue_full": self.rejected["queue_full"],
+            "rejected_queue_timeout": self.rejected["queue_timeout"],
+        }
@@ -0,0 +1,599 @@
+import asyncio
+import functools
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session, State
+from google.adk.sessions.base_session_service import ListSessionsResponse
+
+
+def trim_history(session, history_turns: int) -> int:
+    """
+    Keep only the last history_turns user turns of a session's events.
+
+    Cuts are made at user messages, so a turn is never split from its tool
+    calls and responses. Returns the number of events dropped.
+    """
+    if not history_turns:
+        return 0
+    user_turns = [i for i, event in enumerate(session.events) if event.author == "user"]
+    if len(user_turns) <= history_turns:
+        return 0
+    cut = user_turns[-history_turns]
+    session.events = session.events[cut:]
+    return cut
+
+
+class BoundedSessionService(InMemorySessionService):
+    """
+    In-memory sessions with a cap on how many are kept and for how long.
+
+    - at most max_sessions sessions; creating one more evicts the least recently used
+    - sessions idle for idle_ttl_seconds are evicted
+    - each time the runner loads a session, its history is trimmed to the
+      last history_turns user turns, so prompts stop growing with the conversation
+
+    0 disables a limit. An evicted user simply starts a new conversation.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl_seconds: float = 1800, history_turns: int = 10):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.history_turns = history_turns
+        self.evictions = Counter()
+        self.trimmed_events = 0
+        self._last_access = OrderedDict()
+
+    def _touch(self, key: tuple):
+        self._last_access[key] = time.monotonic()
+        self._last_access.move_to_end(key)
+
+    def _drop(self, key: tuple, reason: str):
+        self._last_access.pop(key, None)
+        app_name, user_id, session_id = key
+        user_sessions = self.sessions.get(app_name, {}).get(user_id, {})
+        user_sessions.pop(session_id, None)
+        if not user_sessions:
+            self.sessions.get(app_name, {}).pop(user_id, None)
+            self.user_state.get(app_name, {}).pop(user_id, None)
+        self.evictions[reason] += 1
+
+    def _evict_idle(self):
+        if not self.idle_ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        while self._last_access:
+            key, last_access = next(iter(self._last_access.items()))
+            if last_access >= cutoff:
+                break
+            self._drop(key, "idle")
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None):
+        self._evict_idle()
+        while self.max_sessions and len(self._last_access) >= self.max_sessions:
+            self._drop(next(iter(self._last_access)), "lru")
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._touch((app_name, user_id, session.id))
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None):
+        self._evict_idle()
+        key = (app_name, user_id, session_id)
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is not None:
+            self.trimmed_events += trim_history(stored, self.history_turns)
+            self._touch(key)
+        return await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._last_access.pop((app_name, user_id, session_id), None)
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        if key in self._last_access:
+            self._touch(key)
+        return event
+
+    def stats(self) -> dict:
+        """Gauges for /health: live sessions, average history length, evictions."""
+        histories = [
+            len(session.events)
+            for users in self.sessions.values()
+            for user_sessions in users.values()
+            for session in user_sessions.values()
+        ]
+        return {
+            "backend": "memory",
+            "live_sessions": len(histories),
+            "max_sessions": self.max_sessions,
+            "avg_history_events": round(sum(histories) / len(histories), 2) if histories else 0.0,
+            "history_turns": self.history_turns,
+            "evictions": {"lru": self.evictions["lru"], "idle": self.evictions["idle"]},
+            "trimmed_events": self.trimmed_events,
+        }
+
+
+SESSION_MIGRATIONS = [
+    # 1: sessions, events and shared state
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        app_name TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        state TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        last_update_time REAL NOT NULL,
+        PRIMARY KEY (app_name, user_id, session_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_update ON sessions (last_update_time);
+    CREATE TABLE IF NOT EXISTS events (
+        app_name TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        author TEXT NOT NULL,
+        event TEXT NOT NULL,
+        PRIMARY KEY (app_name, user_id, session_id, seq)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS app_states (
+        app_name TEXT PRIMARY KEY,
+        state TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS user_states (
+        app_name TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (app_name, user_id)
+    ) WITHOUT ROWID;
+    """,
+]
+
+
+def split_statements(script: str) -> list:
+    """Split a migration script into complete SQL statements."""
+    statements, current = [], ""
+    for part in script.split(";"):
+        current += part + ";"
+        if sqlite3.complete_statement(current):
+            if current.strip(" \n;"):
+                statements.append(current)
+            current = ""
+    return statements
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending SESSION_MIGRATIONS and return the schema version.
+
+    The version is re-read after taking the write lock, so a worker that
+    waited for another one to migrate does not apply the same steps again.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(SESSION_MIGRATIONS):
+        return len(SESSION_MIGRATIONS)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version in range(current + 1, len(SESSION_MIGRATIONS) + 1):
+            for statement in split_statements(SESSION_MIGRATIONS[version - 1]):
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(SESSION_MIGRATIONS)
+
+
+def retry_busy(fn, attempts: int = 6, delay: float = 0.1):
+    """Call fn(), backing off and retrying while another connection holds the database lock."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            busy = "locked" in str(e) or "busy" in str(e)
+            if not busy or attempt == attempts - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+def split_state_delta(state: dict) -> tuple:
+    """Split a state dict into (app, user, session) deltas; temp: keys are dropped."""
+    app, user, session = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+def copy_session(session: Session) -> Session:
+    """Copy a session deeply enough that appending events or state to the copy leaves the original alone."""
+    copied = session.model_copy()
+    copied.events = list(session.events)
+    copied.state = dict(session.state)
+    return copied
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    Sessions in a local SQLite file, shared by every uvicorn worker on the host.
+
+    Unlike ADK's own SqliteSessionService, which opens a connection and
+    commits for every event, this keeps one WAL-mode connection per worker
+    and batches writes: a turn's events are buffered and written in one
+    transaction when the final response is appended (or on flush()).
+
+    Hot sessions are cached per worker. Each flush bumps the session's
+    version, so get_session costs one primary-key lookup when the cached
+    copy is current and only reads the missing events when another worker
+    has written since. Only the last history_turns user turns are loaded,
+    and sessions idle for idle_ttl_seconds are deleted.
+
+    The async methods run their database work on a single thread of their
+    own, so a write waiting on another worker's lock (up to busy_timeout)
+    never stalls the event loop.
+    """
+
+    def __init__(self, db_path: str = "sessions.db", cache_size: int = 10000, idle_ttl_seconds: float = 1800,
+                 history_turns: int = 10, flush_events: int = 32):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.history_turns = history_turns
+        self.flush_events = flush_events
+        self.counters = Counter()
+        self._cache = OrderedDict()   # key -> (version, session)
+        self._pending = {}            # key -> [event, ...] not yet written
+        self._last_sweep = 0.0
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sessions")
+
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=5000")
+        # Workers starting together race for the lock the WAL switch and migrations need
+        retry_busy(lambda: conn.execute("PRAGMA journal_mode=WAL"))
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        retry_busy(lambda: migrate(conn))
+        self._conn = conn
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._flush_all()
+        self._conn.close()
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking database call on the session thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    # Shared state
+
+    def _load_json(self, sql: str, params: tuple) -> dict:
+        row = self._conn.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _merge_shared_state(self, session: Session) -> Session:
+        app_state = self._load_json("SELECT state FROM app_states WHERE app_name = ?", (session.app_name,))
+        user_state = self._load_json(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (session.app_name, session.user_id)
+        )
+        for key, value in app_state.items():
+            session.state[State.APP_PREFIX + key] = value
+        for key, value in user_state.items():
+            session.state[State.USER_PREFIX + key] = value
+        return session
+
+    def _update_shared_state(self, app_name: str, user_id: str, app_delta: dict, user_delta: dict):
+        if app_delta:
+            state = self._load_json("SELECT state FROM app_states WHERE app_name = ?", (app_name,))
+            state.update(app_delta)
+            self._conn.execute(
+                "INSERT INTO app_states (app_name, state) VALUES (?, ?) "
+                "ON CONFLICT (app_name) DO UPDATE SET state = excluded.state",
+                (app_name, json.dumps(state))
+            )
+        if user_delta:
+            state = self._load_json(
+                "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            )
+            state.update(user_delta)
+            self._conn.execute(
+                "INSERT INTO user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state",
+                (app_name, user_id, json.dumps(state))
+            )
+
+    # Hot cache
+
+    def _cache_put(self, key: tuple, version: int, session: Session):
+        self._cache[key] = (version, session)
+        self._cache.move_to_end(key)
+        while self.cache_size and len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _window_start(self, key: tuple, after_seq: int) -> int:
+        """Return the first event seq to load: the start of the last history_turns user turns."""
+        if not self.history_turns:
+            return after_seq + 1
+        row = self._conn.execute(
+            "SELECT seq FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND author = 'user' "
+            "ORDER BY seq DESC LIMIT 1 OFFSET ?",
+            (*key, self.history_turns - 1)
+        ).fetchone()
+        return max(after_seq + 1, row["seq"] if row else 0)
+
+    def _load_events(self, key: tuple, start_seq: int) -> list:
+        rows = self._conn.execute(
+            "SELECT event FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq >= ? "
+            "ORDER BY seq",
+            (*key, start_seq)
+        ).fetchall()
+        return [Event.model_validate_json(row["event"]) for row in rows]
+
+    # Writes
+
+    def _sweep_idle(self):
+        now = time.time()
+        if not self.idle_ttl_seconds or now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        cutoff = now - self.idle_ttl_seconds
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "DELETE FROM events WHERE (app_name, user_id, session_id) IN "
+                "(SELECT app_name, user_id, session_id FROM sessions WHERE last_update_time < ?)",
+                (cutoff,)
+            )
+            deleted = self._conn.execute("DELETE FROM sessions WHERE last_update_time < ?", (cutoff,)).rowcount
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self.counters["idle_evictions"] += deleted
+        for key in [key for key, (_, session) in self._cache.items() if session.last_update_time < cutoff]:
+            self._cache.pop(key, None)
+
+    def _flush_key(self, key: tuple):
+        events = self._pending.pop(key, None)
+        if not events:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT version, state FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            ).fetchone()
+            if row is None:
+                # Deleted or evicted by another worker mid-turn; nothing to append to
+                self._conn.execute("ROLLBACK")
+                self._cache.pop(key, None)
+                return
+            version = row["version"]
+            state = json.loads(row["state"])
+            app_delta, user_delta = {}, {}
+            for event in events:
+                if event.actions and event.actions.state_delta:
+                    app, user, session_delta = split_state_delta(event.actions.state_delta)
+                    app_delta.update(app)
+                    user_delta.update(user)
+                    state.update(session_delta)
+            self._conn.executemany(
+                "INSERT INTO events (app_name, user_id, session_id, seq, author, event) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*key, version + i, event.author, event.model_dump_json(exclude_none=True))
+                 for i, event in enumerate(events, start=1)]
+            )
+            self._conn.execute(
+                "UPDATE sessions SET version = ?, state = ?, last_update_time = ? "
+                "WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (version + len(events), json.dumps(state), events[-1].timestamp, *key)
+            )
+            self._update_shared_state(key[0], key[1], app_delta, user_delta)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            self._cache.pop(key, None)
+            raise
+        self.counters["flushes"] += 1
+        self.counters["flushed_events"] += len(events)
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            # Nobody else wrote in between: extend the cached copy instead of reloading it
+            session = cached[1]
+            session.events.extend(events)
+            session.state.update(state)
+            session.last_update_time = events[-1].timestamp
+            self._cache_put(key, version + len(events), session)
+        else:
+            self._cache.pop(key, None)
+
+    def _flush_all(self):
+        with self._lock:
+            for key in list(self._pending):
+                self._flush_key(key)
+
+    # BaseSessionService
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        return await self._run(self._create_session, app_name, user_id, state, session_id)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None) -> Optional[Session]:
+        return await self._run(self._get_session, app_name, user_id, session_id, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await self._run(self._list_sessions, app_name, user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self._run(self._delete_session, app_name, user_id, session_id)
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> dict[str, Any]:
+        return await self._run(self._get_user_state, app_name, user_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        await self._run(self._buffer_event, session, event)
+        return event
+
+    async def flush(self) -> None:
+        """Write any buffered events (the API calls this after every turn)."""
+        await self._run(self._flush_all)
+
+    # Blocking implementations (run on the session thread)
+
+    def _create_session(self, app_name: str, user_id: str, state: Optional[dict[str, Any]],
+                        session_id: Optional[str]) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        app_delta, user_delta, session_state = split_state_delta(state)
+        now = time.time()
+        with self._lock:
+            self._sweep_idle()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (app_name, user_id, session_id, state, version, last_update_time) "
+                    "VALUES (?, ?, ?, ?, 0, ?)",
+                    (*key, json.dumps(session_state), now)
+                )
+                self._update_shared_state(app_name, user_id, app_delta, user_delta)
+                self._conn.execute("COMMIT")
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK")
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            session = Session(app_name=app_name, user_id=user_id, id=session_id,
+                              state=session_state, last_update_time=now)
+            self._cache_put(key, 0, session)
+            return self._merge_shared_state(copy_session(session))
+
+    def _get_session(self, app_name: str, user_id: str, session_id: str, config) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._flush_key(key)
+            row = self._conn.execute(
+                "SELECT version, state, last_update_time FROM sessions "
+                "WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            ).fetchone()
+            if row is None:
+                self._cache.pop(key, None)
+                return None
+
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == row["version"]:
+                self.counters["cache_hits"] += 1
+                session = cached[1]
+            else:
+                self.counters["cache_misses"] += 1
+                if cached is not None and cached[0] < row["version"]:
+                    # Another worker appended: read only the new events
+                    session = cached[1]
+                    session.events.extend(self._load_events(key, self._window_start(key, cached[0])))
+                else:
+                    session = Session(app_name=app_name, user_id=user_id, id=session_id, state={},
+                                      events=self._load_events(key, self._window_start(key, 0)))
+                session.state = json.loads(row["state"])
+                session.last_update_time = row["last_update_time"]
+            trim_history(session, self.history_turns)
+            self._cache_put(key, row["version"], session)
+
+            copied = copy_session(session)
+            if config is not None:
+                if config.num_recent_events is not None:
+                    copied.events = copied.events[-config.num_recent_events:] if config.num_recent_events else []
+                if config.after_timestamp:
+                    copied.events = [e for e in copied.events if e.timestamp >= config.after_timestamp]
+            return self._merge_shared_state(copied)
+
+    def _list_sessions(self, app_name: str, user_id: Optional[str]) -> ListSessionsResponse:
+        self._flush_all()
+        sql = "SELECT user_id, session_id, state, last_update_time FROM sessions WHERE app_name = ?"
+        params = (app_name,)
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY last_update_time", params).fetchall()
+            sessions = [
+                self._merge_shared_state(Session(
+                    app_name=app_name, user_id=row["user_id"], id=row["session_id"],
+                    state=json.loads(row["state"]), last_update_time=row["last_update_time"]
+                ))
+                for row in rows
+            ]
+        return ListSessionsResponse(sessions=sessions)
+
+    def _delete_session(self, app_name: str, user_id: str, session_id: str):
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._pending.pop(key, None)
+            self._cache.pop(key, None)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _get_user_state(self, app_name: str, user_id: str) -> dict[str, Any]:
+        with self._lock:
+            return self._load_json(
+                "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            )
+
+    def _buffer_event(self, session: Session, event: Event):
+        key = (session.app_name, session.user_id, session.id)
+        with self._lock:
+            pending = self._pending.setdefault(key, [])
+            pending.append(event)
+            turn_done = event.author != "user" and event.is_final_response()
+            if turn_done or len(pending) >= self.flush_events:
+                self._flush_key(key)
+
+    def stats(self) -> dict:
+        """Gauges for /health: stored and cached sessions, history length, cache and batching counters."""
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            histories = [len(session.events) for _, session in self._cache.values()]
+            counters = dict(self.counters)
+        return {
+            "backend": "sqlite",
+            "live_sessions": stored,
+            "cached_sessions": len(histories),
+            "avg_history_events": round(sum(histories) / len(histories), 2) if histories else 0.0,
+            "history_turns": self.history_turns,
+            "evictions": {"idle": counters.get("idle_evictions", 0)},
+            "cache_hits": counters.get("cache_hits", 0),
+            "cache_misses": counters.get("cache_misses", 0),
+            "flushes": counters.get("flushes", 0),
+            "events_per_flush": round(counters.get("flushed_events", 0) / counters["flushes"], 2)
+            if counters.get("flushes") else 0.0,
+        }
@@ -1,60 +1,306 @@
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.core.storage import StorageContext
+from llama_index.core import SimpleDirectoryReader, Settings
+from llama_index.core.schema import MetadataMode
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+import argparse
 import chromadb
+import hashlib
+import multiprocessing
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from catalog import (
+    COLLECTION_PREFIX,
+    active_collection_name,
+    new_catalog_version,
+    read_catalog_manifest,
+    write_catalog_manifest,
+    write_catalog_version,
+)
+from embeddings import EMBED_BACKEND, EMBED_BACKENDS, EMBED_MODEL_NAME, create_embed_model
+from vector_index import CHUNKS_SUFFIX, VECTORS_SUFFIX, save_vector_index, vector_files
+from lexical_index import LEXICAL_SUFFIX, BM25Index, lexical_file
 
-def setup_rag():
+# Bulk ingestion: chunks embedded per batch, and embedding worker processes
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Worker processes each load their own model, so small catalogs are embedded in-process
+EMBED_POOL_MIN_CHUNKS = int(os.getenv("EMBED_POOL_MIN_CHUNKS", "2048"))
+
+
+def hash_product_files(products_dir: str) -> dict:
+    """Return {relative path: sha256} for every file in the products folder."""
+    hashes = {}
+    for root, _, files in os.walk(products_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            hashes[os.path.relpath(path, products_dir).replace(os.sep, "/")] = digest
+    return hashes
+
+
+def iter_product_documents(products_dir: str, files: list):
+    """Stream the given product files one file at a time, tagging documents with their source file."""
+    if not files:
+        return
+    reader = SimpleDirectoryReader(
+        input_files=[os.path.join(products_dir, name) for name in files]
+    )
+    for documents in reader.iter_data():
+        for document in documents:
+            source_file = os.path.relpath(document.metadata["file_path"], products_dir).replace(os.sep, "/")
+            document.metadata["source_file"] = source_file
+            document.excluded_embed_metadata_keys.append("source_file")
+            document.excluded_llm_metadata_keys.append("source_file")
+        yield documents
+
+
+def copy_vectors(chroma_client, source, target, files: list) -> int:
+    """Copy stored chunks of the given source files between collections without re-embedding."""
+    if not files:
+        return 0
+    existing = source.get(
+        where={"source_file": {"$in": files}},
+        include=["embeddings", "documents", "metadatas"]
+    )
+    batch_size = chroma_client.get_max_batch_size()
+    for start in range(0, len(existing["ids"]), batch_size):
+        end = start + batch_size
+        target.add(
+            ids=existing["ids"][start:end],
+            embeddings=existing["embeddings"][start:end],
+            documents=existing["documents"][start:end],
+            metadatas=existing["metadatas"][start:end]
+        )
+    return len(existing["ids"])
+
+
+_worker_embed_model = None
+
+
+def _init_embed_worker(threads: int, backend: str = EMBED_BACKEND):
+    """Load the embedding model once per worker process (or on first use in-process)."""
+    global _worker_embed_model
+    _worker_embed_model = create_embed_model(backend, threads=threads)
+
+
+def _embed_batch(texts: list) -> list:
+    return _worker_embed_model.get_text_embedding_batch(texts)
+
+
+def ingest_documents(document_batches, vector_store, batch_size: int = EMBED_BATCH_SIZE,
+                     workers: int = EMBED_WORKERS, backend: str = EMBED_BACKEND,
+                     pool_min_chunks: int = EMBED_POOL_MIN_CHUNKS) -> dict:
+    """
+    Chunk, embed and store streamed documents in bulk.
+
+    Chunks are embedded in batches of batch_size across a pool of worker
+    processes and written to the vector store one batch at a time. At most
+    two batches per worker are in flight, so memory stays bounded however
+    large the corpus is. The pool only starts once pool_min_chunks chunks
+    are buffered; smaller catalogs are embedded in this process, where one
+    model load is cheaper than one per worker. Returns document/chunk
+    counts and throughput.
+    """
+    start = time.perf_counter()
+    documents = 0
+    chunks = 0
+    pending = deque()
+    buffer = []
+
+    def store(nodes, embeddings):
+        nonlocal chunks
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+        vector_store.add(nodes)
+        chunks += len(nodes)
+        elapsed = time.perf_counter() - start
+        print(f"\rEmbedded {chunks} chunks from {documents} documents "
+              f"({chunks / elapsed:.1f} chunks/sec)", end="", flush=True)
+
+    def submit(nodes, pool):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        if pool is None:
+            if _worker_embed_model is None:
+                print(f"Loading embedding model ({backend} backend)...")
+                _init_embed_worker(0, backend)
+            store(nodes, _embed_batch(texts))
+            return
+        pending.append((nodes, pool.submit(_embed_batch, texts)))
+        while len(pending) >= 2 * workers:
+            done_nodes, future = pending.popleft()
+            store(done_nodes, future.result())
+
+    pool = None
+    decided = workers <= 1  # in-process or pool, settled once enough chunks are buffered
+    try:
+        for batch in document_batches:
+            documents += len(batch)
+            buffer.extend(Settings.node_parser.get_nodes_from_documents(batch))
+            if not decided and len(buffer) >= pool_min_chunks:
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_embed_worker,
+                    initargs=(threads, backend)
+                )
+                decided = True
+            while decided and len(buffer) >= batch_size:
+                submit(buffer[:batch_size], pool)
+                buffer = buffer[batch_size:]
+        while buffer:
+            submit(buffer[:batch_size], pool)
+            buffer = buffer[batch_size:]
+        while pending:
+            done_nodes, future = pending.popleft()
+            store(done_nodes, future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    if chunks:
+        print()
+    return {
+        "documents": documents,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "docs_per_sec": documents / elapsed,
+        "chunks_per_sec": chunks / elapsed,
+    }
+
+
+def export_search_files(chroma_collection, db_path: str) -> int:
+    """
+    Write a collection's vectors and texts for the NumPy retriever
+    (RAG_BACKEND=numpy) and its BM25 index for the lexical fast path.
+    """
+    stored = chroma_collection.get(include=["embeddings", "documents", "metadatas"])
+    save_vector_index(db_path, chroma_collection.name, stored["ids"], stored["embeddings"],
+                      stored["documents"], stored["metadatas"])
+    BM25Index.build(stored["ids"], stored["documents"]).save(lexical_file(db_path, chroma_collection.name))
+    return len(stored["ids"])
+
+
+def remove_stale_collections(chroma_client, keep: set, db_path: str = "./chroma_db"):
+    """Drop old catalog generations and their vector files, keeping the ones in keep."""
+    for collection in chroma_client.list_collections():
+        name = getattr(collection, "name", collection)
+        if name.startswith(COLLECTION_PREFIX) and name not in keep:
+            chroma_client.delete_collection(name)
+            print(f"Removed old collection: {name}")
+    for filename in os.listdir(db_path):
+        for suffix in (VECTORS_SUFFIX, CHUNKS_SUFFIX, LEXICAL_SUFFIX):
+            if (filename.startswith(COLLECTION_PREFIX) and filename.endswith(suffix)
+                    and filename[:-len(suffix)] not in keep):
+                os.remove(os.path.join(db_path, filename))
+
+
+def setup_rag(incremental: bool = False, products_dir: str = "bank_products", db_path: str = "./chroma_db",
+              batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS, backend: str = EMBED_BACKEND):
     """
     Set up RAG system with LlamaIndex and ChromaDB.
     Reads documents from bank_products folder and creates vector index.
+
+    Every build goes into a new collection that only becomes live when the
+    manifest is switched to it, so the API never reads a half-built index.
+    In incremental mode, chunks of unchanged files are copied from the live
+    collection and only added or changed files are embedded. Embedding runs
+    through the batched, multi-process ingest_documents pipeline, on the
+    torch or ONNX backend picked by backend (see embeddings.py).
+    Returns the name of the live collection.
     """
     print("Setting up RAG system...")
-    
-    
-    print("Loading embedding model...")
-    embed_model = HuggingFaceEmbedding(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    Settings.embed_model = embed_model
-    
-    
-    print("Loading product documents...")
-    documents = SimpleDirectoryReader("bank_products").load_data()
-    print(f"Loaded {len(documents)} documents")
-    
-   
+
+    # The embedding model is loaded by ingest_documents, in this process or in
+    # its workers, and only if there is something to embed
+
     print("Setting up vector database...")
-    db_path = "./chroma_db"
     chroma_client = chromadb.PersistentClient(path=db_path)
-    
-    
-    collection_name = "bank_products"
+
+    file_hashes = hash_product_files(products_dir)
+    manifest = read_catalog_manifest(db_path)
     try:
-        chroma_client.delete_collection(collection_name)
-    except:
-        pass
-    
+        previous_collection = chroma_client.get_collection(active_collection_name(db_path))
+    except Exception:
+        previous_collection = None
+    previous_files = manifest.get("files", {}) if incremental and previous_collection is not None else {}
+    if incremental and manifest and previous_collection is None:
+        print(f"Live collection {manifest['collection']} is missing, rebuilding everything")
+    if previous_files and manifest.get("embed_backend", "torch") != backend:
+        # Vectors from another backend are close but not identical; never mix them in one collection
+        print(f"Live collection was embedded with the {manifest.get('embed_backend', 'torch')} backend, "
+              f"rebuilding everything with {backend}")
+        previous_files = {}
+
+    unchanged = sorted(name for name, digest in file_hashes.items() if previous_files.get(name) == digest)
+    changed = sorted(name for name in file_hashes if name not in unchanged)
+    removed = sorted(name for name in previous_files if name not in file_hashes)
+    print(f"Product files: {len(unchanged)} unchanged, {len(changed)} added/changed, {len(removed)} removed")
+
+    if incremental and previous_files and not changed and not removed:
+        print("✅ Catalog is up to date, nothing to re-index")
+        if not (os.path.exists(vector_files(db_path, previous_collection.name)[0])
+                and os.path.exists(lexical_file(db_path, previous_collection.name))):
+            export_search_files(previous_collection, db_path)
+        return previous_collection.name
+
+
+    version = new_catalog_version()
+    collection_name = f"{COLLECTION_PREFIX}_{version}"
     chroma_collection = chroma_client.create_collection(collection_name)
-    
-    
     vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    
-    
-    print("Creating embeddings and index...")
-    index = VectorStoreIndex.from_documents(
-        documents,
-        storage_context=storage_context,
-        show_progress=True
-    )
-    
+
+    if previous_files:
+        copied = copy_vectors(chroma_client, previous_collection, chroma_collection, unchanged)
+        print(f"Reused {copied} chunks from unchanged files")
+
+
+    print(f"Embedding {len(changed)} product files (batch size {batch_size}, {workers} workers)...")
+    stats = ingest_documents(iter_product_documents(products_dir, changed), vector_store,
+                             batch_size, workers, backend)
+    print(f"Ingested {stats['documents']} documents / {stats['chunks']} chunks in {stats['seconds']:.1f}s "
+          f"({stats['docs_per_sec']:.1f} docs/sec, {stats['chunks_per_sec']:.1f} chunks/sec)")
+
+    exported = export_search_files(chroma_collection, db_path)
+    print(f"Wrote vectors and BM25 index for {exported} chunks")
+
+    # Switch the API over to the new collection
+    write_catalog_manifest(db_path, {
+        "version": version,
+        "collection": collection_name,
+        "embed_model": EMBED_MODEL_NAME,
+        "embed_backend": backend,
+        "files": file_hashes
+    })
+    write_catalog_version(db_path, version)
+
+    # Keep the previous generation for servers that have not switched yet
+    keep = {collection_name}
+    if previous_collection is not None:
+        keep.add(previous_collection.name)
+    remove_stale_collections(chroma_client, keep, db_path)
+
     print("✅ RAG system ready!")
     print(f"✅ Vector database stored in: {db_path}")
     print(f"✅ Collection: {collection_name}")
-    
-    return index
+    print(f"✅ Catalog version: {version}")
+
+    return collection_name
 
 if __name__ == "__main__":
-    setup_rag()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the product knowledge vector index")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-embed product files that were added or changed since the last build")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Chunks embedded per batch")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS,
+                        help="Embedding worker processes (1 = embed in this process)")
+    parser.add_argument("--embed-backend", choices=EMBED_BACKENDS, default=EMBED_BACKEND,
+                        help="Embedding backend (default: EMBED_BACKEND or torch)")
+    args = parser.parse_args()
+
+    setup_rag(incremental=args.incremental, batch_size=args.batch_size, workers=args.workers,
+              backend=args.embed_backend)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import re
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+# Simulated model latency per call, so benchmarks can model a real LLM's cost
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+
+CUSTOMER_ID_PATTERN = re.compile(r"\[Customer ID: ([^\]]+)\]\s*")
+
+
+def script_tool_call(text: str) -> types.FunctionCall:
+    """The tool call the agent would make for a customer message, chosen by keyword."""
+    match = CUSTOMER_ID_PATTERN.search(text)
+    customer_id = match.group(1) if match else "user123"
+    query = CUSTOMER_ID_PATTERN.sub("", text).strip()
+    lowered = query.lower()
+    account_type = "savings" if "saving" in lowered else "checking"
+
+    if "balance" in lowered and "card" not in lowered:
+        return types.FunctionCall(name="calculate_account_balance",
+                                  args={"customer_id": customer_id, "account_type": account_type})
+    if "last transaction" in lowered:
+        return types.FunctionCall(name="get_last_transaction",
+                                  args={"customer_id": customer_id, "account_type": account_type})
+    if "transactions" in lowered or "spent" in lowered or "spending" in lowered:
+        return types.FunctionCall(name="get_recent_transactions",
+                                  args={"customer_id": customer_id, "account_type": account_type, "limit": 5})
+    if "overview" in lowered or "summary" in lowered or "how am i doing" in lowered:
+        return types.FunctionCall(name="get_account_summary", args={"customer_id": customer_id})
+    return types.FunctionCall(name="search_product_knowledge", args={"query": query})
+
+
+def describe_result(response: dict) -> str:
+    """Answer text for a tool result: string results as-is, anything else as JSON."""
+    value = response.get("result", response)
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+class StubLlm(BaseLlm):
+    """
+    Deterministic stand-in for the Gemini model (AGENT_MODEL=stub).
+
+    The first call of a turn picks one tool by keyword (see script_tool_call);
+    once the tool result is in the request it answers with that result as
+    text. The real tools, retriever and session handling run unchanged, so
+    the API can be benchmarked offline.
+    """
+
+    model: str = "stub"
+
+    @classmethod
+    def supported_models(cls) -> list:
+        return ["stub"]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if STUB_LLM_LATENCY_MS:
+            await asyncio.sleep(STUB_LLM_LATENCY_MS / 1000)
+
+        parts = (llm_request.contents[-1].parts or []) if llm_request.contents else []
+        results = [part.function_response for part in parts if part.function_response]
+        if results:
+            part = types.Part(text="\n".join(describe_result(result.response or {}) for result in results))
+        else:
+            text = "".join(part.text for part in parts if part.text)
+            part = types.Part(function_call=script_tool_call(text))
+
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=0, candidates_token_count=0, total_token_count=0
+            ),
+        )
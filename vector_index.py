@@ -0,0 +1,117 @@
+import json
+import math
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+# Files setup_rag.py writes next to each Chroma collection
+VECTORS_SUFFIX = ".vectors.npy"
+CHUNKS_SUFFIX = ".chunks.json"
+
+
+class ScoredChunk(NamedTuple):
+    """A retrieved product chunk (same text/score attributes as a llama_index NodeWithScore)."""
+    text: str
+    score: float
+    node_id: str
+    metadata: dict
+
+
+def vector_files(db_path: str, collection_name: str) -> tuple:
+    """Return the (vectors, chunks) file paths for a catalog collection."""
+    base = os.path.join(db_path, collection_name)
+    return base + VECTORS_SUFFIX, base + CHUNKS_SUFFIX
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a float32 matrix."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.clip(norms, 1e-12, None)
+
+
+def save_vector_index(db_path: str, collection_name: str, ids: list, embeddings, texts: list, metadatas: list):
+    """Write a collection's chunks as an L2-normalized float32 matrix plus their texts, atomically."""
+    vectors_path, chunks_path = vector_files(db_path, collection_name)
+    if len(ids):
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+    else:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    with open(vectors_path + ".tmp", "wb") as f:
+        np.save(f, vectors)
+    with open(chunks_path + ".tmp", "w") as f:
+        json.dump({
+            "ids": ids,
+            "texts": texts,
+            # llama_index's serialized node copies are not needed to answer queries
+            "metadatas": [{k: v for k, v in (m or {}).items() if not k.startswith("_")} for m in metadatas],
+        }, f)
+    os.replace(vectors_path + ".tmp", vectors_path)
+    os.replace(chunks_path + ".tmp", chunks_path)
+
+
+class NumpyVectorIndex:
+    """
+    Exact top-k search over a small catalog with one matrix-vector product.
+
+    Vectors are memory-mapped from the .npy file, already L2-normalized, so
+    cosine similarity is a dot product. Scores are reported the way
+    ChromaVectorStore reports them, exp(-squared L2 distance), which for unit
+    vectors is exp(2 * cos - 2); the relevance cutoff in query_product_knowledge
+    means the same thing on either backend.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: list, texts: list, metadatas: list = None,
+                 similarity_top_k: int = 3):
+        if len(vectors) != len(texts) or len(ids) != len(texts):
+            raise ValueError(f"Vector index is inconsistent: {len(vectors)} vectors, {len(texts)} texts")
+        self.vectors = vectors
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas or [{} for _ in texts]
+        self.similarity_top_k = similarity_top_k
+
+    @classmethod
+    def load(cls, db_path: str, collection_name: str, similarity_top_k: int = 3) -> "NumpyVectorIndex":
+        """Memory-map the vectors setup_rag.py wrote for a collection."""
+        vectors_path, chunks_path = vector_files(db_path, collection_name)
+        vectors = np.load(vectors_path, mmap_mode="r")
+        with open(chunks_path) as f:
+            chunks = json.load(f)
+        return cls(vectors, chunks["ids"], chunks["texts"], chunks["metadatas"], similarity_top_k)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _top_k(self, similarities: np.ndarray, top_k: int) -> list:
+        if top_k < len(similarities):
+            candidates = np.argpartition(-similarities, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(similarities))
+        ranked = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        return [
+            ScoredChunk(self.texts[i], math.exp(2.0 * float(similarities[i]) - 2.0), self.ids[i], self.metadatas[i])
+            for i in ranked
+        ]
+
+    def search(self, embedding, top_k: int = None) -> list:
+        """Return the top_k chunks for one query embedding, best first."""
+        top_k = top_k or self.similarity_top_k
+        if not len(self):
+            return []
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        return self._top_k(self.vectors @ query, top_k)
+
+    def search_batch(self, embeddings, top_k: int = None) -> list:
+        """Return the top_k chunks for each of several query embeddings in one matrix product."""
+        top_k = top_k or self.similarity_top_k
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        if not len(self):
+            return [[] for _ in queries]
+        similarities = queries @ self.vectors.T
+        return [self._top_k(row, top_k) for row in similarities]
+
+    def retrieve(self, query_bundle) -> list:
+        """Retriever interface: search with the embedding carried by a llama_index QueryBundle."""
+        return self.search(query_bundle.embedding)
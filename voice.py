@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Speech recognizer: "google" (Google Web Speech API), "sphinx" (offline
+# CMU PocketSphinx) or "stub" (returns VOICE_STUB_TEXT, for benchmarks)
+VOICE_BACKEND = os.getenv("VOICE_BACKEND", "google").lower()
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "4"))
+VOICE_STUB_TEXT = os.getenv("VOICE_STUB_TEXT", "What is my checking account balance?")
+
+VOICE_BACKENDS = ["google", "sphinx", "stub"]
+
+
+class TranscriptionError(Exception):
+    """Audio could not be decoded or recognized."""
+
+
+def decode_audio(audio_file):
+    """Decode WAV/AIFF/FLAC audio from a seekable file object (no temp file)."""
+    import speech_recognition as sr
+
+    audio_file.seek(0)
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(audio_file) as source:
+        return recognizer.record(source)
+
+
+def recognize(audio_data, backend: str = VOICE_BACKEND) -> str:
+    """Turn decoded audio into text with the given recognizer backend."""
+    import speech_recognition as sr
+
+    if backend == "stub":
+        return VOICE_STUB_TEXT
+    recognizer = sr.Recognizer()
+    if backend == "google":
+        return recognizer.recognize_google(audio_data)
+    if backend == "sphinx":
+        return recognizer.recognize_sphinx(audio_data)
+    raise ValueError(f"Unknown VOICE_BACKEND {backend!r}; expected one of {', '.join(VOICE_BACKENDS)}")
+
+
+class Transcriber:
+    """
+    Decodes and recognizes uploads on a bounded thread pool.
+
+    Recognition is blocking (a network call for google, CPU for sphinx), so
+    both stages run off the event loop; at most `workers` transcriptions are
+    in progress at once and the rest wait their turn.
+    """
+
+    def __init__(self, backend: str = VOICE_BACKEND, workers: int = VOICE_WORKERS):
+        if backend not in VOICE_BACKENDS:
+            raise ValueError(f"Unknown VOICE_BACKEND {backend!r}; expected one of {', '.join(VOICE_BACKENDS)}")
+        self.backend = backend
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="voice")
+
+    def _transcribe(self, audio_file, submitted: float) -> tuple:
+        start = time.perf_counter()
+        try:
+            audio_data = decode_audio(audio_file)
+        except Exception as e:
+            raise TranscriptionError(f"could not decode audio: {e}") from e
+        decoded = time.perf_counter()
+        try:
+            text = recognize(audio_data, self.backend)
+        except Exception as e:
+            raise TranscriptionError(str(e) or type(e).__name__) from e
+        recognized = time.perf_counter()
+        return text, {
+            "queue": (start - submitted) * 1000,
+            "decode": (decoded - start) * 1000,
+            "recognize": (recognized - decoded) * 1000,
+        }
+
+    async def transcribe(self, audio_file) -> tuple:
+        """Return (text, {"queue": ms, "decode": ms, "recognize": ms}) for a seekable audio file object."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transcribe, audio_file, time.perf_counter())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def server_timing(timings: dict) -> str:
+    """Format stage timings (ms) as a Server-Timing header value."""
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())